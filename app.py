@@ -72,8 +72,13 @@ class MainApp:
                            base_color="#d7fcd4", hovering_color="White"),
         }
 
+    def step_simulation(self, lab, frame_time):
+        clock = lab.sim_clock
+        for _ in range(clock.advance(frame_time)):
+            lab.update_simulation(clock.dt)
+
     def run(self):
-        
+        frame_time = DT
         while self.running:
             events = pygame.event.get()
             for event in events:
@@ -93,8 +98,8 @@ class MainApp:
                     self.app_state = 'main_menu'
                     pygame.display.set_caption("Physics Lab Menu")
                 else:
-                    self.advanced_projectile_lab.update_simulation()
-                    self.advanced_projectile_lab.draw_all()
+                    self.step_simulation(self.advanced_projectile_lab, frame_time)
+                    self.advanced_projectile_lab.draw_all(self.advanced_projectile_lab.sim_clock.alpha)
             
             elif self.app_state == 'particle_sandbox':
                 app_signal = self.particle_sandbox.handle_events(events)
@@ -102,8 +107,8 @@ class MainApp:
                     self.app_state = 'main_menu'
                     pygame.display.set_caption("Physics Lab Menu")
                 else:
-                    self.particle_sandbox.update_simulation()
-                    self.particle_sandbox.draw_all()
+                    self.step_simulation(self.particle_sandbox, frame_time)
+                    self.particle_sandbox.draw_all(self.particle_sandbox.sim_clock.alpha)
             
             elif self.app_state == 'function_plotter':
                 app_signal = self.function_plotter.handle_events(events)
@@ -115,7 +120,7 @@ class MainApp:
                     self.function_plotter.draw_all()
             
             pygame.display.flip()
-            self.clock.tick(FPS)
+            frame_time = self.clock.tick(FPS) / 1000.0
 
     def handle_menu_events(self, events):
         
@@ -131,9 +136,11 @@ class MainApp:
                     self.app_state = 'projectile_lab'
                     pygame.display.set_caption("Advanced Projectile Lab (RK4 Engine)")
                     self.advanced_projectile_lab.reset_simulation()
+                    self.advanced_projectile_lab.sim_clock.reset()
                 elif self.menu_buttons['PARTICLES'].checkForInput(menu_mouse_pos):
                     self.app_state = 'particle_sandbox'
                     pygame.display.set_caption("Particle Sandbox")
+                    self.particle_sandbox.sim_clock.reset()
                 elif self.menu_buttons['FUNCTION'].checkForInput(menu_mouse_pos):
                     self.app_state = 'function_plotter'
                     pygame.display.set_caption("Function Plotter")
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+import math
+import numpy as np
+from constants import *
+from physics_engine import Adv_Projectile, Adv_ProjectileBatch, hermite_root, hermite_state
+
+
+# Offline flight calculations for the projectile lab: whole sets of launches
+# integrated together with Adv_ProjectileBatch. `params` is the dict built by
+# AdvancedProjectileLab.launch_parameters() (mass, area, g, rho, Cd, wind_vx).
+# `terrain` is an optional terrain.Terrain; without one the ground is y = 0.
+def flight_batch(v0, angle_deg, params, steps=FLIGHT_STEPS, terrain=None):
+    v0, angle_deg = np.broadcast_arrays(np.atleast_1d(np.asarray(v0, dtype=np.float64)),
+                                        np.atleast_1d(np.asarray(angle_deg, dtype=np.float64)))
+    angle = np.radians(angle_deg)
+    x0, y0 = LAUNCH_POS_M
+    vx, vy = v0 * np.cos(angle), v0 * np.sin(angle)
+    states = np.column_stack((np.full(len(v0), x0), np.full(len(v0), y0), vx, vy))
+
+    # Each flight gets its own step: the vacuum flight time split into
+    # `steps` pieces (drag only shortens it), landing refined in between.
+    g = params['g']
+    vacuum_time = (vy + np.sqrt(np.maximum(vy * vy + 2 * g * y0, 0.0))) / g
+    dt = np.maximum(vacuum_time / steps, 1e-4)
+    batch = Adv_ProjectileBatch(states, params['mass'], params['area'], g, params['rho'], params['Cd'],
+                                params['wind_vx'], refine_landing=True, terrain=terrain)
+    return batch, dt
+
+
+def simulate_flights(v0, angle_deg, params, steps=FLIGHT_STEPS, terrain=None):
+    batch, dt = flight_batch(v0, angle_deg, params, steps, terrain)
+    return batch.run(dt)
+
+
+def sweep(axis, values, params, v0, angle_deg, steps=FLIGHT_STEPS, terrain=None):
+    # Range, max height and flight time across `values` of the launch angle
+    # ('angle', degrees) or muzzle velocity ('velocity', m/s).
+    values = np.asarray(values, dtype=np.float64)
+    if axis == 'angle':
+        metrics = simulate_flights(v0, values, params, steps, terrain)
+    else:
+        metrics = simulate_flights(values, angle_deg, params, steps, terrain)
+    metrics['values'] = values
+    return metrics
+
+
+def golden_section_max(f, lo, hi, tol=1e-3, cancelled=None):
+    # Maximum of a unimodal f on [lo, hi]; returns (x, f(x)), or None as
+    # soon as `cancelled()` is true.
+    inv_phi = (math.sqrt(5) - 1) / 2
+    a, b = lo, hi
+    c = b - inv_phi * (b - a)
+    d = a + inv_phi * (b - a)
+    fc, fd = f(c), f(d)
+    while b - a > tol:
+        if cancelled is not None and cancelled():
+            return None
+        if fc >= fd:
+            b, d, fd = d, c, fc
+            c = b - inv_phi * (b - a)
+            fc = f(c)
+        else:
+            a, c, fc = c, d, fd
+            d = a + inv_phi * (b - a)
+            fd = f(d)
+    x = 0.5 * (a + b)
+    return x, f(x)
+
+
+def _rk45_projectile(v0, angle_deg, params, tol, terrain=None):
+    x0, y0 = LAUNCH_POS_M
+    angle = math.radians(angle_deg)
+    return Adv_Projectile(x0, y0, v0 * math.cos(angle), v0 * math.sin(angle), params['mass'], params['area'],
+                          params['g'], params['rho'], params['Cd'], params['wind_vx'],
+                          integrator='rk45', rtol=tol, atol=tol, terrain=terrain)
+
+
+def fly(v0, angle_deg, params, tol=1e-9, terrain=None):
+    # One flight on the adaptive RK45 integrator, run to landing.
+    projectile = _rk45_projectile(v0, angle_deg, params, tol, terrain)
+    projectile.update(math.inf)
+    return projectile
+
+
+def flight_path(params, terrain=None, points_per_step=PREVIEW_POINTS_PER_STEP, tol=1e-6, max_time=600.0, cancelled=None):
+    # (x, y) in meters along one launch for drawing, sampled off the RK45
+    # dense output of each adaptive step and ending on the landing point.
+    # Gives up and returns None as soon as `cancelled()` is true.
+    projectile = _rk45_projectile(params['v0'], params['angle'], params, tol, terrain)
+    thetas = np.linspace(0.0, 1.0, points_per_step + 1)[1:]
+    points = [projectile.state[:2].copy()]
+    for t0, t1 in projectile.adaptive_steps(max_time):
+        if cancelled is not None and cancelled():
+            return None
+        times = t0 + thetas * (t1 - t0)
+        if projectile.landing is not None:
+            times = times[:-1]
+        points.extend(projectile.interpolate(t)[:2] for t in times)
+    if projectile.landing is not None:
+        points.append(projectile.landing[1][:2])
+    return np.array(points)
+
+
+def refine_optimum(axis, result, params, v0, angle_deg, metric='range', tol=1e-2, terrain=None, cancelled=None):
+    # Golden-section search between the neighbours of the best sweep sample.
+    # Single flights go through RK45, which is far cheaper than a batch of one.
+    values, scores = result['values'], result[metric]
+    best = int(np.argmax(scores))
+    lo, hi = values[max(best - 1, 0)], values[min(best + 1, len(values) - 1)]
+
+    def score(value):
+        if axis == 'angle':
+            projectile = fly(v0, value, params, terrain=terrain)
+        else:
+            projectile = fly(value, angle_deg, params, terrain=terrain)
+        return {'range': projectile.x, 'max_height': projectile.max_height, 'flight_time': projectile.time}[metric]
+
+    return golden_section_max(score, lo, hi, tol, cancelled)
+
+
+def sweep_optimum(axis, values, params, metric='range', terrain=None, cancelled=None):
+    # sweep() plus refine_optimum() around its best sample, as one job for a
+    # PreviewWorker: returns (values, result, best), or None if cancelled.
+    result = sweep(axis, values, params, params['v0'], params['angle'], terrain=terrain)
+    if cancelled is not None and cancelled():
+        return None
+    best = refine_optimum(axis, result, params, params['v0'], params['angle'], metric, terrain=terrain,
+                          cancelled=cancelled)
+    if best is None:
+        return None
+    return values, result, best
+
+
+# --- Launch solutions (shooting method) ---
+def heights_at(x_target, v0, angle_deg, params, steps=FLIGHT_STEPS, terrain=None):
+    # Height of each flight as it passes x_target. Flights that land short
+    # report minus the distance they fell short by, which keeps the miss
+    # continuous across the shots that land exactly at x_target.
+    batch, dt = flight_batch(v0, angle_deg, params, steps, terrain)
+    height = np.full(len(batch), np.nan)
+    while batch.is_active.any():
+        before, time_before = batch.state.copy(), batch.time.copy()
+        batch.update_rk4(dt)
+        rows = np.flatnonzero(np.isnan(height) & (before[:, 0] < x_target) & (batch.state[:, 0] >= x_target))
+        if len(rows):
+            s0, s1, h = before[rows], batch.state[rows], batch.time[rows] - time_before[rows]
+            theta = hermite_root(s0, s1, h, 0, x_target)
+            height[rows] = hermite_state(s0, s1, h, theta)[:, 1]
+            batch.is_active[rows] = False
+
+    short = np.isnan(height)
+    height[short] = batch.state[short, 0] - x_target
+    return height
+
+
+def _refine_roots(miss, lo, hi, miss_lo, miss_hi, rounds=2, points=16):
+    # Shrinks every bracket at once: each round evaluates `points` interior
+    # candidates per bracket in a single batch (multi-way bisection) and keeps
+    # the first sub-interval with a sign change. A final secant step finishes.
+    rows = np.arange(len(lo))
+    fractions = np.linspace(0.0, 1.0, points + 2)[1:-1]
+    for _ in range(rounds):
+        inner = lo[:, None] + (hi - lo)[:, None] * fractions
+        grid = np.column_stack((lo, inner, hi))
+        values = np.column_stack((miss_lo, miss(inner.ravel()).reshape(inner.shape), miss_hi))
+        change = np.signbit(values[:, :-1]) != np.signbit(values[:, 1:])
+        k = np.argmax(change, axis=1)
+        lo, hi = grid[rows, k], grid[rows, k + 1]
+        miss_lo, miss_hi = values[rows, k], values[rows, k + 1]
+    return lo - miss_lo * (hi - lo) / (miss_hi - miss_lo)
+
+
+def _bracket_roots(miss, values):
+    m = miss(values)
+    i = np.flatnonzero(np.signbit(m[:-1]) != np.signbit(m[1:]))
+    return values[i], values[i + 1], m[i], m[i + 1]
+
+
+def solve_angle(target, v0, params, grid_points=91, terrain=None):
+    # Launch angles (degrees, low arc first) at muzzle speed v0 whose flight
+    # passes through target = (x, y), under the full drag and wind model.
+    x_target, y_target = target
+    if x_target <= LAUNCH_POS_M[0]:
+        return []
+    miss = lambda angles: heights_at(x_target, v0, angles, params, terrain=terrain) - y_target
+    lo, hi, miss_lo, miss_hi = _bracket_roots(miss, np.linspace(0.0, 90.0, grid_points))
+    if len(lo) == 0:
+        return []
+    return sorted(float(angle) for angle in _refine_roots(miss, lo, hi, miss_lo, miss_hi))
+
+
+def solve_velocity(target, angle_deg, params, v_min=1.0, v_max=500.0, grid_points=64, terrain=None):
+    # Slowest muzzle speed at a fixed angle that reaches target, or None.
+    x_target, y_target = target
+    if x_target <= LAUNCH_POS_M[0]:
+        return None
+    miss = lambda speeds: heights_at(x_target, speeds, angle_deg, params, terrain=terrain) - y_target
+    lo, hi, miss_lo, miss_hi = _bracket_roots(miss, np.linspace(v_min, v_max, grid_points))
+    if len(lo) == 0:
+        return None
+    return float(_refine_roots(miss, lo[:1], hi[:1], miss_lo[:1], miss_hi[:1])[0])
+
+
+# --- Dispersion (Monte Carlo) ---
+def perturbed_launches(params, spread, count, rng):
+    # Normal draws around the current settings. `spread` holds standard
+    # deviations for 'v0' (m/s), 'Cd', 'wind_vx' (m/s) and 'mass' (a fraction
+    # of the mass); returns per-launch speeds and a params dict of arrays.
+    v0 = np.maximum(rng.normal(params['v0'], spread['v0'], count), 0.1)
+    launch = dict(params)
+    launch['Cd'] = np.maximum(rng.normal(params['Cd'], spread['Cd'], count), 0.0)
+    launch['wind_vx'] = rng.normal(params['wind_vx'], spread['wind_vx'], count)
+    launch['mass'] = params['mass'] * np.maximum(rng.normal(1.0, spread['mass'], count), 0.05)
+    return v0, launch
+
+
+def dispersion_steps(params, spread, total, chunk_size=DISPERSION_CHUNK, max_time=600.0, seed=None, terrain=None):
+    # Flies `total` perturbed launches in batches of chunk_size. Yields after
+    # every integrator step, so the caller can stop on a time budget and
+    # resume next frame: None while a batch is in the air, then the impact
+    # x of its landed launches.
+    rng = np.random.default_rng(seed)
+    done = 0
+    while done < total:
+        count = min(chunk_size, total - done)
+        v0, launch = perturbed_launches(params, spread, count, rng)
+        batch, dt = flight_batch(v0, params['angle'], launch, terrain=terrain)
+        yield None
+        for _ in range(int(math.ceil(max_time / np.min(dt)))):
+            if not batch.is_active.any():
+                break
+            batch.update_rk4(dt)
+            yield None
+        yield batch.state[~batch.is_active, 0]
+        done += count
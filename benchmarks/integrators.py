@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+# Accuracy versus cost of the projectile integrators.
+#
+#   python -m benchmarks.integrators
+#   python -m benchmarks.integrators --dts 0.1 0.03 0.01 0.003 --tolerances 1e-4 1e-6 1e-8
+#   python -m benchmarks.integrators --accuracy 0.01 --output integrators.json
+#
+# Flies one launch with every fixed-step scheme over a range of dt, and with
+# adaptive RK45 over a range of tolerances, with drag off and on. Drag-off
+# runs are scored against the closed form in Adv_IdealProjectile, drag-on
+# runs against RK45 at a tolerance of 1e-12. Each row reports the range and
+# apex error next to the derivative evaluations and wall time of the flight.
+import argparse
+import json
+import math
+import platform
+import time
+import numpy as np
+
+from constants import *
+from physics_engine import Adv_Projectile, Adv_IdealProjectile, hermite_root, hermite_state
+from benchmarks.sandbox import git_revision
+
+REFERENCE_TOLERANCE = 1e-12
+
+
+# Fixed-step schemes: each takes the projectile (for its derivative function
+# and evaluation counter), the state and dt, and returns the next state.
+# `cache` carries an acceleration from one step to the next where the
+# scheme can reuse it.
+def euler_step(proj, state, dt, cache):
+    proj.evaluations += 1
+    return state + dt * proj.derivatives(state, proj.time)
+
+
+def semi_implicit_euler_step(proj, state, dt, cache):
+    proj.evaluations += 1
+    accel = proj.derivatives(state, proj.time)[2:]
+    vel = state[2:] + dt * accel
+    return np.concatenate((state[:2] + dt * vel, vel))
+
+
+def velocity_verlet_step(proj, state, dt, cache):
+    # Drag depends on velocity, so the end-of-step acceleration is taken at a
+    # predicted velocity; it is reused as the next step's starting value.
+    if 'accel' not in cache:
+        proj.evaluations += 1
+        cache['accel'] = proj.derivatives(state, proj.time)[2:]
+    accel = cache['accel']
+    pos = state[:2] + dt * state[2:] + 0.5 * dt * dt * accel
+    predicted = np.concatenate((pos, state[2:] + dt * accel))
+    proj.evaluations += 1
+    new_accel = proj.derivatives(predicted, proj.time + dt)[2:]
+    cache['accel'] = new_accel
+    return np.concatenate((pos, state[2:] + 0.5 * dt * (accel + new_accel)))
+
+
+def rk4_step(proj, state, dt, cache):
+    # The engine's own RK4 step; update_rk4 adds only the ground clamp, and
+    # the landing is found the same way as for the other schemes.
+    return proj.rk4_step(state, proj.time, dt)
+
+
+FIXED_STEP = {
+    'euler': euler_step,
+    'semi_implicit_euler': semi_implicit_euler_step,
+    'velocity_verlet': velocity_verlet_step,
+    'rk4': rk4_step,
+}
+SCHEMES = tuple(FIXED_STEP) + ('rk45',)
+
+
+def make_projectile(case, integrator='rk4', tolerance=1e-6):
+    angle = math.radians(case['angle'])
+    return Adv_Projectile(LAUNCH_POS_M[0], LAUNCH_POS_M[1], case['v0'] * math.cos(angle), case['v0'] * math.sin(angle),
+                          case['mass'], case['area'], case['g'], case['rho'], case['Cd'], case['wind_vx'],
+                          integrator=integrator, rtol=tolerance, atol=tolerance)
+
+
+def _apex_in_step(s0, s1, h):
+    # Height where the Hermite cubic for y over one step turns over.
+    p0, p1, m0, m1 = s0[1], s1[1], h * s0[3], h * s1[3]
+    c2 = -3 * p0 - 2 * m0 + 3 * p1 - m1
+    c3 = 2 * p0 + m0 - 2 * p1 + m1
+    roots = np.roots([3 * c3, 2 * c2, m0]) if abs(c3) > 1e-15 or abs(c2) > 1e-15 else []
+    theta = [r.real for r in np.atleast_1d(roots) if abs(r.imag) < 1e-12 and 0.0 <= r.real <= 1.0]
+    if not theta:
+        return max(p0, p1)
+    return max(p0 + t * (m0 + t * (c2 + t * c3)) for t in theta)
+
+
+def fly_fixed(case, scheme, dt, max_time=600.0):
+    # Steps until the flight drops below the ground, then places the landing
+    # and the apex on a cubic Hermite interpolant of the step that crossed.
+    proj = make_projectile(case)
+    step = FIXED_STEP[scheme]
+    state, cache = proj.state.copy(), {}
+    apex = state[1]
+    while proj.time < max_time:
+        new_state = step(proj, state, dt, cache)
+        if state[3] > 0 >= new_state[3]:
+            apex = max(apex, _apex_in_step(state, new_state, dt))
+        if new_state[1] < 0:
+            s0, s1, h = state[None], new_state[None], np.array([dt])
+            theta = hermite_root(s0, s1, h, 1, 0.0)
+            landing = hermite_state(s0, s1, h, theta)[0]
+            return landing[0], max(apex, landing[1]), proj.evaluations
+        state = new_state
+        proj.time += dt
+    return math.nan, apex, proj.evaluations
+
+
+def fly_rk45(case, tolerance, max_time=600.0):
+    # update_rk45 already puts landing and apex on its dense output; the
+    # display step only decides how often it is polled.
+    proj = make_projectile(case, 'rk45', tolerance)
+    while proj.is_active and proj.time < max_time:
+        proj.update_rk45(1.0)
+    if proj.is_active:
+        return math.nan, proj.max_height, proj.evaluations
+    return proj.x, proj.max_height, proj.evaluations
+
+
+def reference(case):
+    if case['drag']:
+        range_m, apex_m, _ = fly_rk45(case, REFERENCE_TOLERANCE)
+        return range_m, apex_m, f"rk45 tol {REFERENCE_TOLERANCE:g}"
+    angle = math.radians(case['angle'])
+    ideal = Adv_IdealProjectile(LAUNCH_POS_M[0], LAUNCH_POS_M[1], case['v0'] * math.cos(angle),
+                                case['v0'] * math.sin(angle), case['g'])
+    return ideal.range, ideal.max_height, "closed form"
+
+
+def timed(fly, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fly()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def run_case(case, dts, tolerances, repeats):
+    ref_range, ref_apex, ref_name = reference(case)
+    runs = [(scheme, 'dt', dt, lambda s=scheme, d=dt: fly_fixed(case, s, d)) for scheme in FIXED_STEP for dt in dts]
+    runs += [('rk45', 'tol', tol, lambda t=tol: fly_rk45(case, t)) for tol in tolerances]
+
+    rows = []
+    for scheme, setting, value, fly in runs:
+        (range_m, apex_m, evaluations), elapsed = timed(fly, repeats)
+        rows.append({
+            'drag': case['drag'],
+            'scheme': scheme,
+            setting: value,
+            'range_m': range_m,
+            'apex_m': apex_m,
+            'range_error_m': abs(range_m - ref_range),
+            'apex_error_m': abs(apex_m - ref_apex),
+            'evaluations': evaluations,
+            'ms': 1000.0 * elapsed,
+        })
+    return {'drag': case['drag'], 'reference': ref_name, 'reference_range_m': ref_range,
+            'reference_apex_m': ref_apex, 'rows': rows}
+
+
+def cheapest(rows, accuracy):
+    # The run with the fewest evaluations whose range and apex errors both
+    # stay within `accuracy` meters, or None.
+    passing = [row for row in rows if max(row['range_error_m'], row['apex_error_m']) <= accuracy]
+    return min(passing, key=lambda row: (row['evaluations'], row['ms'])) if passing else None
+
+
+def setting_text(row):
+    return f"dt {row['dt']:.4g}" if 'dt' in row else f"tol {row['tol']:g}"
+
+
+def print_table(result, accuracy=None):
+    drag = "on" if result['drag'] else "off"
+    print(f"\nDrag {drag}: range {result['reference_range_m']:.4f} m, apex {result['reference_apex_m']:.4f} m "
+          f"({result['reference']})")
+    print(f"{'scheme':>20} {'setting':>12} {'range err m':>12} {'apex err m':>12} {'evals':>8} {'ms':>9}")
+    for row in result['rows']:
+        print(f"{row['scheme']:>20} {setting_text(row):>12} {row['range_error_m']:>12.3e} "
+              f"{row['apex_error_m']:>12.3e} {row['evaluations']:>8} {row['ms']:>9.3f}")
+    if accuracy is not None:
+        best = cheapest(result['rows'], accuracy)
+        if best is None:
+            print(f"No run is within {accuracy:g} m.")
+        else:
+            print(f"Cheapest within {accuracy:g} m: {best['scheme']} at {setting_text(best)} "
+                  f"({best['evaluations']} evaluations, {best['ms']:.3f} ms)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Projectile integrator accuracy versus cost")
+    parser.add_argument('--dts', type=float, nargs='+', default=[0.1, 0.05, 1 / 60, 0.005, 0.001])
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[1e-3, 1e-4, 1e-6, 1e-8, 1e-10])
+    parser.add_argument('--v0', type=float, default=100.0)
+    parser.add_argument('--angle', type=float, default=45.0)
+    parser.add_argument('--mass', type=float, default=10.0)
+    parser.add_argument('--radius', type=float, default=0.1)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--accuracy', type=float, help="also name the cheapest run within this many meters")
+    parser.add_argument('--output', help="write results to this JSON file")
+    args = parser.parse_args()
+
+    base = {'v0': args.v0, 'angle': args.angle, 'mass': args.mass, 'area': math.pi * args.radius ** 2,
+            'g': DEFAULT_GRAVITY_M, 'wind_vx': DEFAULT_WIND_VX_M}
+    cases = [dict(base, drag=False, rho=0.0, Cd=0.0, wind_vx=0.0),
+             dict(base, drag=True, rho=DEFAULT_AIR_DENSITY, Cd=DEFAULT_DRAG_COEFF)]
+
+    results = []
+    for case in cases:
+        result = run_case(case, args.dts, args.tolerances, args.repeats)
+        print_table(result, args.accuracy)
+        results.append(result)
+
+    if args.output:
+        report = {
+            'benchmark': 'integrators',
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.platform(),
+            'config': {'dts': args.dts, 'tolerances': args.tolerances, 'v0': args.v0, 'angle': args.angle,
+                       'mass': args.mass, 'radius': args.radius, 'repeats': args.repeats},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+# Headless throughput benchmark for the Particle Sandbox.
+#
+#   python -m benchmarks.sandbox --counts 100 1000 5000 20000 --output sandbox.json
+#   python -m benchmarks.sandbox --compare sandbox.json
+#   python -m benchmarks.sandbox --counts 1000 5000 --draw
+#   python -m benchmarks.sandbox --counts 10000 20000 50000 --workers 8
+#
+# Runs ParticleSandbox.step() under SDL's dummy video driver with seeded RNGs,
+# so runs on the same machine are comparable between versions.
+import os
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import argparse
+import json
+import math
+import platform
+import random
+import subprocess
+import time
+import tracemalloc
+import numpy as np
+import pygame
+
+from constants import *
+from simulations.collosion import ParticleSandbox
+from parallel_collisions import ParallelCollisionSolver
+
+PHASES = ('integrate', 'wall', 'ccd', 'pairs', 'removal', 'sleep')
+
+
+def make_sandbox(screen, fonts, seed, broad_phase, workers=0):
+    random.seed(seed)
+    np.random.seed(seed)
+    sandbox = ParticleSandbox(screen, screen.get_rect(), fonts)
+    sandbox.checkboxes['spawner_active'].checked = False
+    sandbox.checkboxes['spatial_hash'].checked = broad_phase == 'grid'
+    sandbox.checkboxes['parallel'].checked = workers > 0
+    if workers > 0:
+        sandbox.parallel_solver = ParallelCollisionSolver(workers)
+    sandbox.read_controls()
+    # Keep the gap shut so the particle count stays at N for the whole run.
+    sandbox.container_gap_angle = 0.0
+    return sandbox
+
+
+def populate(sandbox, count, seed, vel_var=20.0):
+    # Square lattice inside the container; the radius shrinks for large N so
+    # everything fits at roughly half packing density.
+    rng = np.random.default_rng(seed)
+    inner = sandbox.container_radius - 2
+    spacing = inner * math.sqrt(math.pi / count) * 0.95
+    radius = min(8.0, spacing / 2.2)
+
+    steps = np.arange(-inner, inner + spacing, spacing)
+    gx, gy = np.meshgrid(steps, steps)
+    lattice = np.column_stack((gx.ravel(), gy.ravel()))
+    lattice = lattice[np.hypot(lattice[:, 0], lattice[:, 1]) + radius < inner]
+    lattice = lattice[rng.permutation(len(lattice))[:count]]
+
+    for offset in lattice:
+        vel = rng.uniform(-vel_var, vel_var, size=2)
+        sandbox.particles.add(sandbox.container_center + offset, vel, radius=radius)
+    return radius
+
+
+def run_case(screen, fonts, count, steps, warmup, seed, broad_phase, draw=False, workers=0):
+    sandbox = make_sandbox(screen, fonts, seed, broad_phase, workers)
+    radius = populate(sandbox, count, seed)
+
+    dt = sandbox.sim_clock.dt
+    for _ in range(warmup):
+        sandbox.step(dt)
+
+    totals = dict.fromkeys(PHASES, 0.0)
+    start = time.perf_counter()
+    for _ in range(steps):
+        sandbox.step(dt)
+        for phase in PHASES:
+            totals[phase] += sandbox.phase_times[phase]
+    elapsed = time.perf_counter() - start
+
+    # Rendering is timed on its own so steps/s stays comparable with older runs.
+    draw_ms = None
+    if draw:
+        start = time.perf_counter()
+        for _ in range(steps):
+            sandbox.draw_simulation_area()
+        draw_ms = 1000.0 * (time.perf_counter() - start) / steps
+
+    # Memory is measured on a separate short run: tracemalloc slows every
+    # allocation down and would skew the timings above.
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    for _ in range(max(1, steps // 10)):
+        sandbox.step(dt)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if sandbox.parallel_solver is not None:
+        sandbox.parallel_solver.close()
+
+    return {
+        'particles': count,
+        'actual_particles': len(sandbox.particles),
+        'radius': round(radius, 3),
+        'steps': steps,
+        'dt': dt,
+        'steps_per_sec': steps / elapsed,
+        'ms_per_step': 1000.0 * elapsed / steps,
+        'phase_ms': {phase: 1000.0 * totals[phase] / steps for phase in PHASES},
+        'draw_ms': draw_ms,
+        'peak_memory_mb': peak / (1024 * 1024),
+        'contacts_last_step': sandbox.contact_pairs,
+        'workers': workers if count >= PARALLEL_MIN_PARTICLES else 0,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+def print_table(results, baseline=None):
+    header = f"{'N':>7} {'steps/s':>9} {'ms/step':>8} " + " ".join(f"{p:>9}" for p in PHASES) + f" {'peak MB':>8}"
+    show_draw = any(row.get('draw_ms') is not None for row in results)
+    if show_draw:
+        header += f" {'draw ms':>8}"
+    if baseline:
+        header += f" {'vs base':>8}"
+    print(header)
+    for row in results:
+        line = f"{row['particles']:>7} {row['steps_per_sec']:>9.1f} {row['ms_per_step']:>8.2f} "
+        line += " ".join(f"{row['phase_ms'][p]:>9.3f}" for p in PHASES)
+        line += f" {row['peak_memory_mb']:>8.2f}"
+        if show_draw:
+            line += f" {row['draw_ms']:>8.3f}" if row.get('draw_ms') is not None else f" {'-':>8}"
+        if baseline:
+            base = baseline.get(row['particles'])
+            line += f" {row['steps_per_sec'] / base['steps_per_sec']:>7.2f}x" if base else f" {'-':>8}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless Particle Sandbox throughput benchmark")
+    parser.add_argument('--counts', type=int, nargs='+', default=[100, 1000, 5000, 20000])
+    parser.add_argument('--steps', type=int, default=200)
+    parser.add_argument('--warmup', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--broad-phase', choices=('grid', 'brute'), default='grid')
+    parser.add_argument('--workers', type=int, default=0,
+                        help=f"solve collisions on this many processes (only for N >= {PARALLEL_MIN_PARTICLES})")
+    parser.add_argument('--draw', action='store_true', help="also time draw_simulation_area() per frame")
+    parser.add_argument('--output', help="write results to this JSON file")
+    parser.add_argument('--compare', help="JSON file from an earlier run to compare against")
+    args = parser.parse_args()
+
+    pygame.init()
+    pygame.font.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    fonts = {
+        'small': pygame.font.Font(None, 14),
+        'medium': pygame.font.Font(None, 18),
+        'large': pygame.font.Font(None, 26),
+        'title': pygame.font.Font(None, 48),
+    }
+
+    results = [run_case(screen, fonts, count, args.steps, args.warmup, args.seed, args.broad_phase, args.draw, args.workers)
+               for count in args.counts]
+    pygame.quit()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {row['particles']: row for row in json.load(f)['results']}
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            'benchmark': 'particle_sandbox',
+            'revision': git_revision(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pygame': pygame.version.ver,
+            'machine': platform.platform(),
+            'config': {'steps': args.steps, 'warmup': args.warmup, 'seed': args.seed,
+                       'broad_phase': args.broad_phase, 'draw': args.draw,
+                       'workers': args.workers},
+            'results': results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,14 +17,47 @@ GRASS_GREEN = (34, 139, 34)
 TARGET_COLOR = (255, 165, 0)
 GRAPH_BG = (245, 245, 245)
 GRAPH_GRID = (200, 200, 200)
+PREVIEW_COLOR = (70, 70, 140)
+LAYER_COLOR_KEY = (255, 0, 255)
+DISPERSION_COLOR = (110, 60, 170)
+DISPERSION_BAND_OUTER = (200, 180, 230)
+DISPERSION_BAND_INNER = (150, 110, 200)
 
 
 DEFAULT_GRAVITY_PX = 100.0
 FPS = 60
 DT = 1 / FPS
+MAX_CATCHUP_FRAMES = 2
+SANDBOX_PHYSICS_HZ = 240
+
+SLEEP_DRIFT_RATIO = 0.5
+SLEEP_TIME = 0.5
+WAKE_SPEED_PX = 40.0
+PARALLEL_MIN_PARTICLES = 5000
 
 
 DEFAULT_GRAVITY_M = 9.81
 DEFAULT_AIR_DENSITY = 1.225
 DEFAULT_DRAG_COEFF = 0.47
-DEFAULT_WIND_VX_M = 0.0
\ No newline at end of file
+DEFAULT_WIND_VX_M = 0.0
+LAUNCH_POS_M = (0.0, 0.1)
+FLIGHT_STEPS = 64
+SWEEP_POINTS = 181
+TRAJECTORY_CACHE_MB = 16
+TRAJECTORY_KEY_DIGITS = 6
+PREVIEW_POINTS_PER_STEP = 8
+PREVIEW_INTERVAL = 1 / 30
+TRAIL_HISTORY = 25
+TRAIL_MAX_POINTS = 20000
+TRAIL_TOLERANCE_PX = 0.75
+TRAIL_RAW_TAIL = 64
+DISPERSION_CHUNK = 5000
+DISPERSION_FRAME_BUDGET = 0.008
+DISPERSION_BIN_PX = 4
+DISPERSION_BAR_PX = 120
+SALVO_SIZE = 200
+SALVO_SHELL_PX = 3
+EXPORT_DIR = "flight_exports"
+TERRAIN_SPACING = 1.0
+TERRAIN_LENGTH = 8000.0
+TERRAIN_FILE = "assets/terrain.npy"
\ No newline at end of file
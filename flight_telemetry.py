@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+import math
+import numpy as np
+
+
+CHANNELS = ('time', 'x', 'y', 'vx', 'vy', 'speed', 'drag_force', 'kinetic_energy', 'potential_energy', 'total_energy')
+CHANNEL_LABELS = {
+    'time': "Time (s)",
+    'x': "Distance (m)",
+    'y': "Altitude (m)",
+    'vx': "Horizontal Velocity (m/s)",
+    'vy': "Vertical Velocity (m/s)",
+    'speed': "Speed (m/s)",
+    'drag_force': "Drag Force (N)",
+    'kinetic_energy': "Kinetic Energy (J)",
+    'potential_energy': "Potential Energy (J)",
+    'total_energy': "Total Energy (J)",
+}
+_INDEX = {name: i for i, name in enumerate(CHANNELS)}
+
+
+class FlightTelemetry:
+    # Every integrator step of one flight, one preallocated float array per
+    # channel (rows of `columns`), doubled in place when full. The derived
+    # channels use the same drag model as Adv_Projectile.
+    def __init__(self, params, capacity=1024):
+        self.params = dict(params)
+        self.columns = np.empty((len(CHANNELS), capacity))
+        self.count = 0
+        self.k = 0.5 * params['rho'] * params['area'] * params['Cd']
+
+    def __len__(self):
+        return self.count
+
+    def record(self, t, state):
+        if self.count == self.columns.shape[1]:
+            grown = np.empty((len(CHANNELS), 2 * self.columns.shape[1]))
+            grown[:, :self.count] = self.columns[:, :self.count]
+            self.columns = grown
+        x, y, vx, vy = state
+        mass, g = self.params['mass'], self.params['g']
+        speed = math.hypot(vx, vy)
+        drag_force = self.k * ((vx - self.params['wind_vx']) ** 2 + vy ** 2)
+        kinetic = 0.5 * mass * speed * speed
+        potential = mass * g * y
+        self.columns[:, self.count] = (t, x, y, vx, vy, speed, drag_force, kinetic, potential, kinetic + potential)
+        self.count += 1
+
+    def channel(self, name):
+        return self.columns[_INDEX[name], :self.count]
+
+    def save_npz(self, path):
+        # One array per channel, plus the launch settings as param_<name>.
+        arrays = {name: self.channel(name) for name in CHANNELS}
+        arrays.update({f"param_{key}": np.float64(value) for key, value in self.params.items()})
+        np.savez_compressed(path, **arrays)
+
+    def save_csv(self, path):
+        np.savetxt(path, self.columns[:, :self.count].T, fmt='%.10g', delimiter=',', header=','.join(CHANNELS), comments='')
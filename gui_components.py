@@ -1,5 +1,6 @@
 # -*- coding: utf-8 -*-
 import pygame
+import numpy as np
 from constants import *
 
 
@@ -214,6 +215,7 @@ class Adv_Graph:
         self.font = font
         self.max_points = max_points
         self.data = []
+        self.marker = None
         self.padding = 30
         self.plot_area = pygame.Rect(
             rect.x + self.padding, rect.y + 5,
@@ -222,12 +224,25 @@ class Adv_Graph:
 
     def clear_data(self):
         self.data = []
+        self.marker = None
 
     def add_data_point(self, x, y):
         self.data.append((x, y))
         if len(self.data) > self.max_points:
             self.data.pop(0)
 
+    def set_data(self, xs, ys, marker=None):
+        # Replaces the whole series (e.g. a precomputed sweep); `marker` is
+        # an optional (x, y) point to highlight.
+        self.data = list(zip(xs, ys))[-self.max_points:]
+        self.marker = marker
+
+    def set_series(self, xs, ys):
+        # Plots two equal-length arrays as they are, without the max_points
+        # cap; long series are thinned to the plot width when drawn.
+        self.data = (xs, ys)
+        self.marker = None
+
     def draw_axes(self, screen):
         pygame.draw.line(screen, BLACK, (self.plot_area.left, self.plot_area.bottom), (self.plot_area.right, self.plot_area.bottom), 2)
         pygame.draw.line(screen, BLACK, (self.plot_area.left, self.plot_area.bottom), (self.plot_area.left, self.plot_area.top), 2)
@@ -240,30 +255,39 @@ class Adv_Graph:
         screen.blit(y_label_surf, (self.plot_area.left - self.padding + 5, self.plot_area.centery - y_label_surf.get_height() // 2))
 
     def draw_data(self, screen):
-        if len(self.data) < 2:
+        if isinstance(self.data, tuple):
+            xs, ys = self.data
+        else:
+            xs, ys = np.asarray(self.data, dtype=np.float64).reshape(-1, 2).T
+        if len(xs) < 2:
             return
+        stride = max(1, len(xs) // (2 * self.plot_area.width))
+        if stride > 1:
+            xs, ys = np.append(xs[::stride], xs[-1]), np.append(ys[::stride], ys[-1])
 
-        max_x = max(p[0] for p in self.data) if self.data else 1
-        max_y = max(p[1] for p in self.data) if self.data else 1
-        min_x = min(p[0] for p in self.data)
-        min_y = 0 
+        max_x, min_x = xs.max(), xs.min()
+        max_y = ys.max()
+        min_y = min(0.0, ys.min())
         
         if max_x == min_x: max_x += 1
         if max_y <= min_y: max_y = min_y + 1
 
-        points = []
-        for x, y in self.data:
-            x_norm = (x - min_x) / (max_x - min_x)
-            y_norm = (y - min_y) / (max_y - min_y)
-            
-            x_pix = self.plot_area.left + x_norm * self.plot_area.width
-            y_pix = self.plot_area.bottom - y_norm * self.plot_area.height
-            points.append((x_pix, y_pix))
-            
-        pygame.draw.lines(screen, RED, False, points, 2)
+        x_pix = self.plot_area.left + (xs - min_x) / (max_x - min_x) * self.plot_area.width
+        y_pix = self.plot_area.bottom - (ys - min_y) / (max_y - min_y) * self.plot_area.height
+        pygame.draw.lines(screen, RED, False, np.column_stack((x_pix, y_pix)).tolist(), 2)
+
+        if self.marker is not None:
+            mx, my = self.marker
+            marker_pix = (self.plot_area.left + (mx - min_x) / (max_x - min_x) * self.plot_area.width,
+                          self.plot_area.bottom - (my - min_y) / (max_y - min_y) * self.plot_area.height)
+            pygame.draw.line(screen, BLUE, (marker_pix[0], self.plot_area.bottom), marker_pix, 1)
+            pygame.draw.circle(screen, BLUE, marker_pix, 5)
 
         max_y_text = self.font.render(f"{max_y:.1f}", True, DARK_GRAY)
         screen.blit(max_y_text, (self.plot_area.left + 5, self.plot_area.top))
+        if min_y < 0:
+            min_y_text = self.font.render(f"{min_y:.1f}", True, DARK_GRAY)
+            screen.blit(min_y_text, (self.plot_area.left + 5, self.plot_area.bottom - min_y_text.get_height()))
         max_x_text = self.font.render(f"{max_x:.1f}", True, DARK_GRAY)
         screen.blit(max_x_text, (self.plot_area.right - max_x_text.get_width() - 5, self.plot_area.bottom - max_x_text.get_height() - 5))
 
@@ -1,7 +1,10 @@
+import multiprocessing
 import pygame
 from app import MainApp
 
 if __name__ == "__main__":
+    # The multi-core sandbox solver spawns worker processes; needed for frozen builds.
+    multiprocessing.freeze_support()
    
     pygame.init()
     pygame.font.init()
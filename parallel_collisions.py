@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import os
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from types import SimpleNamespace
+import numpy as np
+
+from physics_engine import spatial_hash_pairs, touching_pairs, resolve_collision_pairs, sort_pairs
+
+
+# --- Worker side ---
+# Each worker process keeps the shared blocks it has seen attached, keyed by
+# name, so a step only pays for pickling a few names and index arrays.
+_attached = {}
+
+
+def _view(spec, count):
+    name, shape, dtype = spec
+    if name not in _attached:
+        _attached[name] = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, dtype=dtype, buffer=_attached[name].buf)[:count]
+
+
+def _detach_stale(live_names):
+    for name in [n for n in _attached if n not in live_names]:
+        _attached.pop(name).close()
+
+
+def _strip_pairs(specs, count, x0, x1, reach):
+    _detach_stale({spec[0] for spec in specs.values()})
+    pos = _view(specs['pos'], count)
+    radius = _view(specs['radius'], count)
+
+    # Particles owned by this strip plus a halo of width `reach` on its left,
+    # so every pair crossing the left border is found here exactly once.
+    x = pos[:, 0]
+    idx = np.flatnonzero((x >= x0 - reach) & (x < x1))
+    li, lj = spatial_hash_pairs(pos[idx], radius[idx])
+    pairs_i, pairs_j = idx[li], idx[lj]
+    owned = (x[pairs_i] >= x0) | (x[pairs_j] >= x0)
+    return touching_pairs(pos, radius, pairs_i[owned], pairs_j[owned])
+
+
+def _solve_strip(specs, count, pairs_i, pairs_j):
+    system = SimpleNamespace(**{key: _view(spec, count) for key, spec in specs.items()})
+    return resolve_collision_pairs(system, pairs_i, pairs_j, fixed=system.fixed)
+
+
+# --- Main process side ---
+class ParallelCollisionSolver:
+    # Splits the particles into vertical strips of equal population. Workers
+    # find and solve the pairs inside their own strip on shared-memory copies
+    # of the particle arrays; pairs that cross a strip border are solved
+    # afterwards in the main process, always in the same order, so results do
+    # not depend on which worker finishes first.
+    _FIELDS = {'pos': ((2,), np.float64), 'vel': ((2,), np.float64), 'radius': ((), np.float64),
+               'mass': ((), np.float64), 'fixed': ((), np.bool_)}
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+        self.capacity = 0
+        self.blocks = {}
+        self.arrays = {}
+        self.edges = None
+        self.border_pairs = 0
+        atexit.register(self.close)
+
+    def _reserve(self, count):
+        if count <= self.capacity:
+            return
+        self._release()
+        self.capacity = max(1024, 2 * count)
+        for key, (shape, dtype) in self._FIELDS.items():
+            full_shape = (self.capacity,) + shape
+            size = max(1, int(np.prod(full_shape)) * np.dtype(dtype).itemsize)
+            block = shared_memory.SharedMemory(create=True, size=size)
+            self.blocks[key] = block
+            self.arrays[key] = np.ndarray(full_shape, dtype=dtype, buffer=block.buf)
+
+    def _release(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            block.unlink()
+        self.blocks = {}
+        self.capacity = 0
+
+    def _specs(self, keys):
+        return {key: (self.blocks[key].name, self.arrays[key].shape, self.arrays[key].dtype.str) for key in keys}
+
+    def find_pairs(self, system, rows=None):
+        # Touching pairs for the whole system, or only among `rows` (sorted
+        # indices), sorted like the serial broad phases.
+        pos = system.pos if rows is None else system.pos[rows]
+        radius = system.radius if rows is None else system.radius[rows]
+        n = len(pos)
+        self._reserve(n)
+        self.arrays['pos'][:n] = pos
+        self.arrays['radius'][:n] = radius
+
+        x = pos[:, 0]
+        self.edges = np.quantile(x, np.linspace(0.0, 1.0, self.workers + 1)) if n else np.zeros(self.workers + 1)
+        self.edges[0], self.edges[-1] = -np.inf, np.inf
+        reach = 2.0 * float(radius.max()) if n else 0.0
+
+        specs = self._specs(('pos', 'radius'))
+        jobs = [self.pool.submit(_strip_pairs, specs, n, self.edges[k], self.edges[k + 1], reach)
+                for k in range(self.workers)]
+        results = [job.result() for job in jobs]
+        pairs_i = np.concatenate([r[0] for r in results]).astype(np.intp)
+        pairs_j = np.concatenate([r[1] for r in results]).astype(np.intp)
+        pairs_i, pairs_j = sort_pairs(pairs_i, pairs_j)
+        if rows is not None:
+            pairs_i, pairs_j = rows[pairs_i], rows[pairs_j]
+        return pairs_i, pairs_j
+
+    def resolve(self, system, pairs_i, pairs_j, fixed=None):
+        n = len(system)
+        self._reserve(n)
+        if self.edges is None or len(pairs_i) == 0:
+            self.border_pairs = 0
+            return resolve_collision_pairs(system, pairs_i, pairs_j, fixed=fixed)
+
+        strip = np.searchsorted(self.edges, system.pos[:, 0], side='right') - 1
+        strip_i, strip_j = strip[pairs_i], strip[pairs_j]
+        interior = strip_i == strip_j
+        self.border_pairs = int(np.count_nonzero(~interior))
+
+        arrays = self.arrays
+        arrays['pos'][:n] = system.pos
+        arrays['vel'][:n] = system.vel
+        arrays['radius'][:n] = system.radius
+        arrays['mass'][:n] = system.mass
+        arrays['fixed'][:n] = False if fixed is None else fixed
+
+        specs = self._specs(self._FIELDS)
+        jobs = []
+        for k in range(self.workers):
+            mine = interior & (strip_i == k)
+            if np.any(mine):
+                jobs.append(self.pool.submit(_solve_strip, specs, n, pairs_i[mine], pairs_j[mine]))
+        contacts = sum(job.result() for job in jobs)
+
+        system.pos[:] = arrays['pos'][:n]
+        system.vel[:] = arrays['vel'][:n]
+        contacts += resolve_collision_pairs(system, pairs_i[~interior], pairs_j[~interior], fixed=fixed)
+        return contacts
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=True)
+            self.pool = None
+        self._release()
@@ -6,9 +6,34 @@ import random
 from constants import *
 
 
+# Dormand-Prince 5(4) tableau, error weights and dense-output polynomial
+# (the same coefficients scipy's RK45 uses).
+_DOPRI_C = np.array([0, 1/5, 3/10, 4/5, 8/9, 1])
+_DOPRI_A = [
+    np.array([]),
+    np.array([1/5]),
+    np.array([3/40, 9/40]),
+    np.array([44/45, -56/15, 32/9]),
+    np.array([19372/6561, -25360/2187, 64448/6561, -212/729]),
+    np.array([9017/3168, -355/33, 46732/5247, 49/176, -5103/18656]),
+]
+_DOPRI_B = np.array([35/384, 0, 500/1113, 125/192, -2187/6784, 11/84])
+_DOPRI_E = np.array([-71/57600, 0, 71/16695, -71/1920, 17253/339200, -22/525, 1/40])
+_DOPRI_P = np.array([
+    [1, -8048581381/2820520608, 8663915743/2820520608, -12715105075/11282082432],
+    [0, 0, 0, 0],
+    [0, 131558114200/32700410799, -68118460800/10900136933, 87487479700/32700410799],
+    [0, -1754552775/470086768, 14199869525/1410260304, -10690763975/1880347072],
+    [0, 127303824393/49829197408, -318862633887/49829197408, 701980252875/199316789632],
+    [0, -282668133/205662961, 2019193451/616988883, -1453857185/822651844],
+    [0, 40617522/29380423, -110615467/29380423, 69997945/29380423],
+])
+
+
 class Adv_Projectile:
-    def __init__(self, x, y, vx, vy, mass, area, g, rho, Cd, wind_vx):
+    def __init__(self, x, y, vx, vy, mass, area, g, rho, Cd, wind_vx, integrator='rk4', rtol=1e-6, atol=1e-6, terrain=None):
         self.state = np.array([x, y, vx, vy])
+        self.prev_state = self.state.copy()
         self.mass = mass
         self.area = area
         self.g = g
@@ -20,6 +45,23 @@ class Adv_Projectile:
         self.is_active = True
         self.time = 0.0
         self.max_height = 0.0
+        self.integrator = integrator
+        self.rtol = rtol
+        self.atol = atol
+        self.evaluations = 0
+        # Without a terrain the ground is the line y = 0. Level ground at
+        # zero is the same line, so it keeps the closed-form ground test.
+        self.terrain = None if terrain is None or terrain.flat else terrain
+
+        # RK45 runs ahead of the display time in adaptive steps; the display
+        # state is read off the dense output of the step covering it.
+        self._solver_t = 0.0
+        self._solver_y = self.state.copy()
+        self._solver_f = None
+        self._h = None
+        self._segment = None
+        self.apex = None
+        self.landing = None
 
     @property
     def x(self): return self.state[0]
@@ -30,7 +72,10 @@ class Adv_Projectile:
     @property
     def vy(self): return self.state[3]
 
-    def _calculate_derivatives(self, state_vec, t):
+    def ground(self, x):
+        return 0.0 if self.terrain is None else float(self.terrain.height(x))
+
+    def derivatives(self, state_vec, t):
         x, y, vx, vy = state_vec
         
         dxdt = vx
@@ -57,33 +102,171 @@ class Adv_Projectile:
         
         return np.array([dxdt, dydt, ax, ay])
 
+    def update(self, dt):
+        if self.integrator == 'rk45':
+            self.update_rk45(dt)
+        else:
+            self.update_rk4(dt)
+
+    def rk4_step(self, state, t, dt):
+        # One classic RK4 step from (state, t), with no ground handling.
+        k1 = self.derivatives(state, t)
+        k2 = self.derivatives(state + 0.5 * dt * k1, t + 0.5 * dt)
+        k3 = self.derivatives(state + 0.5 * dt * k2, t + 0.5 * dt)
+        k4 = self.derivatives(state + dt * k3, t + dt)
+        self.evaluations += 4
+        return state + (dt / 6.0) * (k1 + 2 * k2 + 2 * k3 + k4)
+
     def update_rk4(self, dt):
         if not self.is_active:
             return
 
-        k1 = self._calculate_derivatives(self.state, self.time)
-        k2 = self._calculate_derivatives(self.state + 0.5 * dt * k1, self.time + 0.5 * dt)
-        k3 = self._calculate_derivatives(self.state + 0.5 * dt * k2, self.time + 0.5 * dt)
-        k4 = self._calculate_derivatives(self.state + dt * k3, self.time + dt)
-        
-        self.state = self.state + (dt / 6.0) * (k1 + 2 * k2 + 2 * k3 + k4)
+        self.prev_state = self.state
+        self.state = self.rk4_step(self.state, self.time, dt)
         
         self.time += dt
         if self.y > self.max_height:
             self.max_height = self.y
             
-        if self.y < 0:
-            self.state[1] = 0
+        if self.terrain is None:
+            if self.y < 0:
+                self.state[1] = 0
+                self.is_active = False
+        elif self.y < self.ground(self.x):
+            # Impact somewhere inside the step: bisect along the Hermite
+            # cubic between the two states for where it meets the ground.
+            s0, s1, h = self.prev_state[None], self.state[None], np.array([dt])
+            theta = _bisect_impact(s0, s1, h, self.terrain.height)
+            self.state = hermite_state(s0, s1, h, theta)[0]
+            self.state[1] = self.ground(self.x)
+            self.time -= (1.0 - theta[0]) * dt
             self.is_active = False
 
-    def draw(self, screen, zoom, origin, sim_rect):
+    def update_rk45(self, dt):
+        # Advances the display time by dt. Landing is located on the dense
+        # output, so time, range and impact velocity are exact to tolerance
+        # instead of being rounded to the frame step.
+        if not self.is_active:
+            return
+
+        self.prev_state = self.state
+        target = self.time + dt
+        while self._solver_t < target and self.landing is None:
+            self._dopri_step()
+
+        if self.landing is not None and self.landing[0] <= target:
+            self.time, self.state = self.landing[0], self.landing[1].copy()
+            self.is_active = False
+        else:
+            self.time = target
+            self.state = self._dense_output(self._segment, (target - self._segment[0]) / self._segment[1])
+
+        self.max_height = max(self.max_height, self.y)
+        if self.apex is not None and self.apex[0] <= self.time:
+            self.max_height = max(self.max_height, self.apex[1])
+
+    def adaptive_steps(self, max_time=600.0):
+        # Runs the RK45 solver ahead one adaptive step at a time without
+        # moving the display state, yielding (t0, t1) of each step; the last
+        # one ends at the landing. interpolate() reads states inside it.
+        while self.landing is None and self._solver_t < max_time:
+            self._dopri_step()
+            t0, h = self._segment[:2]
+            yield t0, (t0 + h if self.landing is None else self.landing[0])
+
+    def interpolate(self, t):
+        # State at solver time t within the latest adaptive step.
+        t0, h = self._segment[:2]
+        return self._dense_output(self._segment, (t - t0) / h)
+
+    def _error_scale(self, y, y_new):
+        return self.atol + self.rtol * np.maximum(np.abs(y), np.abs(y_new))
+
+    def _dopri_step(self):
+        t, y = self._solver_t, self._solver_y
+        if self._solver_f is None:
+            self._solver_f = self.derivatives(y, t)
+            self.evaluations += 1
+        if self._h is None:
+            scale = self._error_scale(y, y)
+            d0 = np.sqrt(np.mean((y / scale) ** 2))
+            d1 = np.sqrt(np.mean((self._solver_f / scale) ** 2))
+            self._h = 0.01 * d0 / d1 if d0 > 1e-5 and d1 > 1e-5 else 1e-3
+
+        K = np.empty((7, 4))
+        K[0] = self._solver_f
+        while True:
+            h = self._h
+            for s in range(1, 6):
+                K[s] = self.derivatives(y + h * (_DOPRI_A[s] @ K[:s]), t + _DOPRI_C[s] * h)
+            y_new = y + h * (_DOPRI_B @ K[:6])
+            K[6] = self.derivatives(y_new, t + h)
+            self.evaluations += 6
+
+            error = h * (_DOPRI_E @ K) / self._error_scale(y, y_new)
+            error_norm = np.sqrt(np.mean(error ** 2))
+            factor = 0.9 * error_norm ** -0.2 if error_norm > 0 else 10.0
+            if error_norm <= 1.0:
+                self._h = h * min(10.0, factor)
+                break
+            self._h = h * max(0.2, factor)
+
+        segment = (t, h, y, K.copy())
+        if y[3] > 0 >= y_new[3]:
+            theta = self._locate(segment, lambda state: state[3])
+            self.apex = (t + theta * h, self._dense_output(segment, theta)[1])
+        bracket = self._impact_bracket(segment, y, y_new)
+        if bracket is not None:
+            theta = self._locate(segment, lambda state: state[1] - self.ground(state[0]), *bracket)
+            state = self._dense_output(segment, theta)
+            state[1] = self.ground(state[0])
+            self.landing = (t + theta * h, state)
+
+        self._segment = segment
+        self._solver_t, self._solver_y, self._solver_f = t + h, y_new, K[6]
+
+    def _dense_output(self, segment, theta):
+        t, h, y, K = segment
+        powers = theta ** np.arange(1, 5)
+        return y + h * (K.T @ (_DOPRI_P @ powers))
+
+    def _impact_bracket(self, segment, y, y_new):
+        # (lo, hi) in theta around the first point of the step that is below
+        # the ground, or None. Adaptive steps span hundreds of meters, so with
+        # a terrain the dense output is sampled every half terrain spacing in
+        # x; checking only the step ends would fly through any hill between.
+        if self.terrain is None:
+            return (0.0, 1.0) if y_new[1] < 0 <= y[1] else None
+        h, K = segment[1], segment[3]
+        samples = 2 * int(abs(y_new[0] - y[0]) / self.terrain.spacing) + 2
+        theta = np.linspace(0.0, 1.0, samples + 1)
+        powers = theta[:, None] ** np.arange(1, 5)
+        pos = y[:2] + h * (powers @ (_DOPRI_P.T @ K[:, :2]))
+        below = np.flatnonzero(pos[:, 1] < self.terrain.height(pos[:, 0]))
+        if len(below) == 0 or below[0] == 0:
+            return None
+        return theta[below[0] - 1], theta[below[0]]
+
+    def _locate(self, segment, value, lo=0.0, hi=1.0):
+        # Bisection for where value(state) turns from positive to not inside
+        # a step: vy for the apex, height above the ground for the landing.
+        for _ in range(60):
+            mid = 0.5 * (lo + hi)
+            if value(self._dense_output(segment, mid)) > 0:
+                lo = mid
+            else:
+                hi = mid
+        return hi
+
+    def draw(self, screen, zoom, origin, sim_rect, alpha=1.0):
         if not self.is_active:
             return
         
-       
+        x = self.prev_state[0] + alpha * (self.x - self.prev_state[0])
+        y = self.prev_state[1] + alpha * (self.y - self.prev_state[1])
         origin_x, origin_y = origin
-        x_pix = origin_x + int(self.x * zoom)
-        y_pix = origin_y - int(self.y * zoom)
+        x_pix = origin_x + int(x * zoom)
+        y_pix = origin_y - int(y * zoom)
         pos_pix = (x_pix, y_pix)
         
         if not sim_rect.collidepoint(pos_pix):
@@ -92,130 +275,719 @@ class Adv_Projectile:
         pygame.draw.circle(screen, BLACK, pos_pix, 6)
         pygame.draw.circle(screen, DARK_GRAY, pos_pix, 6, 1)
 
+
+class Adv_ProjectileReplay(Adv_Projectile):
+    # Plays back a recorded flight (trajectory_cache.Flight) with the same
+    # interface as a live projectile, interpolating between samples so a
+    # different frame step or time scale still lands on the recorded path.
+    def __init__(self, flight):
+        self.flight = flight
+        self.state = flight.samples[0, 1:].copy()
+        self.prev_state = self.state.copy()
+        self.is_active = True
+        self.time = 0.0
+        self.max_height = 0.0
+        self.integrator = flight.integrator
+        self.evaluations = 0
+
+    def update(self, dt):
+        if not self.is_active:
+            return
+
+        self.prev_state = self.state
+        samples = self.flight.samples
+        self.time += dt
+        if self.time >= self.flight.duration:
+            self.time = self.flight.duration
+            self.state = samples[-1, 1:].copy()
+            self.max_height = self.flight.max_height
+            self.is_active = False
+            return
+
+        i = int(np.searchsorted(samples[:, 0], self.time, side='right'))
+        t0, t1 = samples[i - 1, 0], samples[i, 0]
+        theta = (self.time - t0) / (t1 - t0)
+        self.state = samples[i - 1, 1:] + theta * (samples[i, 1:] - samples[i - 1, 1:])
+        self.max_height = max(self.max_height, self.y)
+
+
+def hermite_state(s0, s1, h, theta):
+    # Cubic Hermite interpolation of (x, y, vx, vy) rows across one step of
+    # length h, using the velocities as the position derivatives.
+    t2, t3 = theta * theta, theta * theta * theta
+    h00, h10, h01, h11 = 2 * t3 - 3 * t2 + 1, t3 - 2 * t2 + theta, -2 * t3 + 3 * t2, t3 - t2
+    d00, d10, d01, d11 = 6 * t2 - 6 * theta, 3 * t2 - 4 * theta + 1, -6 * t2 + 6 * theta, 3 * t2 - 2 * theta
+    p0, p1, v0, v1 = s0[:, :2], s1[:, :2], s0[:, 2:], s1[:, 2:]
+    hh = h[:, None]
+    pos = h00[:, None] * p0 + h10[:, None] * hh * v0 + h01[:, None] * p1 + h11[:, None] * hh * v1
+    vel = (d00[:, None] * p0 + d01[:, None] * p1) / hh + d10[:, None] * v0 + d11[:, None] * v1
+    return np.hstack((pos, vel))
+
+
+def hermite_root(s0, s1, h, component, target):
+    # Theta in [0, 1] where the interpolated x (component 0) or y (component 1)
+    # reaches `target`, by Newton on the Hermite cubic starting from the chord.
+    p0, p1 = s0[:, component] - target, s1[:, component] - target
+    m0, m1 = h * s0[:, component + 2], h * s1[:, component + 2]
+    c2 = -3 * p0 - 2 * m0 + 3 * p1 - m1
+    c3 = 2 * p0 + m0 - 2 * p1 + m1
+    theta = p0 / (p0 - p1)
+    for _ in range(6):
+        value = p0 + theta * (m0 + theta * (c2 + theta * c3))
+        slope = m0 + theta * (2 * c2 + 3 * theta * c3)
+        slope = np.where(np.abs(slope) > 1e-12, slope, np.copysign(1e-12, p1 - p0))
+        theta = np.clip(theta - value / slope, 0.0, 1.0)
+    return theta
+
+
+def _bisect_impact(s0, s1, h, ground, iterations=32):
+    # Theta in [0, 1] per row where the Hermite interpolant of a step that
+    # starts above ground(x) and ends below it meets the ground. Only the
+    # position cubics are evaluated inside the loop.
+    hh = h[:, None]
+    p0, p1, m0, m1 = s0[:, :2], s1[:, :2], hh * s0[:, 2:], hh * s1[:, 2:]
+    c2 = -3 * p0 - 2 * m0 + 3 * p1 - m1
+    c3 = 2 * p0 + m0 - 2 * p1 + m1
+    lo, hi = np.zeros(len(s0)), np.ones(len(s0))
+    for _ in range(iterations):
+        mid = 0.5 * (lo + hi)
+        t = mid[:, None]
+        pos = p0 + t * (m0 + t * (c2 + t * c3))
+        above = pos[:, 1] > ground(pos[:, 0])
+        lo = np.where(above, mid, lo)
+        hi = np.where(above, hi, mid)
+    return hi
+
+
+class Adv_ProjectileBatch:
+    # Many Adv_Projectile flights integrated together, one row of `state`
+    # (x, y, vx, vy) per projectile. Parameters are scalars or per-row arrays.
+    # With refine_landing, the ground crossing inside the last step is found
+    # on a Hermite interpolant instead of stopping at the step end, so coarse
+    # steps still give accurate flight time and range. With a terrain the
+    # ground is its heightfield and the crossing is found by bisection.
+    def __init__(self, states, mass, area, g, rho, Cd, wind_vx, refine_landing=False, terrain=None):
+        self.state = np.array(states, dtype=np.float64).reshape(-1, 4)
+        n = len(self.state)
+        column = lambda value: np.broadcast_to(np.asarray(value, dtype=np.float64), (n,)).copy()
+        self.mass = column(mass)
+        self.area = column(area)
+        self.g = column(g)
+        self.rho = column(rho)
+        self.Cd = column(Cd)
+        self.wind_vx = column(wind_vx)
+        self.k = 0.5 * self.rho * self.area * self.Cd
+
+        self.refine_landing = refine_landing
+        self.terrain = None if terrain is None or terrain.flat else terrain
+
+        self.is_active = np.ones(n, dtype=bool)
+        self.time = np.zeros(n)
+        self.max_height = np.zeros(n)
+
+    _ROWS = ('state', 'mass', 'area', 'g', 'rho', 'Cd', 'wind_vx', 'k', 'is_active', 'time', 'max_height')
+
+    def __len__(self):
+        return len(self.state)
+
+    def compact(self):
+        # Drops the rows that have landed.
+        keep = self.is_active
+        for name in self._ROWS:
+            setattr(self, name, getattr(self, name)[keep])
+
+    def extend(self, other):
+        # Appends the rows of another batch, after dropping landed ones, so a
+        # batch fed by repeated launches only carries what is still flying.
+        self.compact()
+        for name in self._ROWS:
+            setattr(self, name, np.concatenate((getattr(self, name), getattr(other, name))))
+
+    def _calculate_derivatives(self, states, wind_vx, k_over_m, g):
+        vx, vy = states[:, 2], states[:, 3]
+        v_rel_x = vx - wind_vx
+        v_rel_mag = np.sqrt(v_rel_x ** 2 + vy ** 2)
+        # Drag acceleration k |v_rel| v_rel / m, same model as Adv_Projectile.
+        c = k_over_m * v_rel_mag
+        return np.column_stack((vx, vy, -c * v_rel_x, -g - c * vy))
+
+    def update_rk4(self, dt):
+        # dt is a scalar or one step length per row.
+        rows = np.flatnonzero(self.is_active)
+        if len(rows) == 0:
+            return
+
+        h = np.broadcast_to(np.asarray(dt, dtype=np.float64), self.time.shape)[rows]
+        hh = h[:, None]
+        start = self.state[rows]
+        params = (self.wind_vx[rows], self.k[rows] / self.mass[rows], self.g[rows])
+        k1 = self._calculate_derivatives(start, *params)
+        k2 = self._calculate_derivatives(start + 0.5 * hh * k1, *params)
+        k3 = self._calculate_derivatives(start + 0.5 * hh * k2, *params)
+        k4 = self._calculate_derivatives(start + hh * k3, *params)
+        state = start + (hh / 6.0) * (k1 + 2 * k2 + 2 * k3 + k4)
+
+        self.time[rows] += h
+        self.max_height[rows] = np.maximum(self.max_height[rows], state[:, 1])
+
+        if self.terrain is None:
+            landed = np.flatnonzero(state[:, 1] < 0)
+        else:
+            landed = np.flatnonzero(state[:, 1] < self.terrain.height(state[:, 0]))
+        if self.refine_landing and len(landed):
+            s0, s1, h_landed = start[landed], state[landed], h[landed]
+            if self.terrain is None:
+                theta = hermite_root(s0, s1, h_landed, 1, 0.0)
+            else:
+                theta = _bisect_impact(s0, s1, h_landed, self.terrain.height)
+            state[landed] = hermite_state(s0, s1, h_landed, theta)
+            self.time[rows[landed]] -= (1.0 - theta) * h_landed
+        state[landed, 1] = 0 if self.terrain is None else self.terrain.height(state[landed, 0])
+        self.state[rows] = state
+        self.is_active[rows[landed]] = False
+
+    def run(self, dt, max_time=600.0):
+        steps = int(math.ceil(max_time / np.min(dt)))
+        for _ in range(steps):
+            if not self.is_active.any():
+                break
+            self.update_rk4(dt)
+        return self.flight_metrics()
+
+    def flight_metrics(self):
+        # Rows still active after run() hit max_time in the air; `landed` says which.
+        vx, vy = self.state[:, 2], self.state[:, 3]
+        return {
+            'state': self.state.copy(),
+            'landed': ~self.is_active,
+            'flight_time': self.time.copy(),
+            'range': self.state[:, 0].copy(),
+            'max_height': self.max_height.copy(),
+            'impact_speed': np.sqrt(vx ** 2 + vy ** 2),
+            'impact_angle': np.degrees(np.arctan2(-vy, vx)),
+        }
+
 class Adv_IdealProjectile:
-    def __init__(self, x, y, vx, vy, g):
-        self.x = x
-        self.y = y
+    # Drag-free flight in closed form. The whole path is evaluated at launch,
+    # one sample every sample_dt plus the exact landing point, and update()
+    # only moves an index along it.
+    def __init__(self, x, y, vx, vy, g, sample_dt=DT):
         self.vx_initial = vx
         self.vy_initial = vy
         self.g = g
+        self.flight_time = (vy + math.sqrt(max(vy * vy + 2 * g * y, 0.0))) / g
+        apex_time = max(vy / g, 0.0)
+        self.max_height = y + vy * apex_time - 0.5 * g * apex_time ** 2
+        self.range = x + vx * self.flight_time
+
+        self.times = np.append(np.arange(0.0, self.flight_time, sample_dt), self.flight_time)
+        self.path = np.column_stack((x + vx * self.times, y + vy * self.times - 0.5 * g * self.times ** 2))
+        self.path[-1, 1] = 0.0
+        self.index = 0
         self.time = 0.0
+        self.x, self.y = x, y
         self.is_active = True
 
     def update(self, dt):
         if not self.is_active:
             return
-            
-        self.time += dt
-        self.x = self.vx_initial * self.time
-        self.y = (self.vy_initial * self.time) - (0.5 * self.g * self.time**2)
-        
-        if self.y < 0:
-            self.y = 0
+
+        self.time = min(self.time + dt, self.flight_time)
+        self.index = int(np.searchsorted(self.times, self.time, side='right'))
+        self.x, self.y = self.path[self.index - 1]
+        if self.time >= self.flight_time:
             self.is_active = False
 
+    def finish(self):
+        self.update(math.inf)
 
-class Particle:
-    def __init__(self, position, velocity, radius=8):
-        self.pos = np.array(position, dtype=np.float64)
-        self.vel = np.array(velocity, dtype=np.float64)
-        self.radius = radius
-        self.mass = self.radius ** 2
-        self.color = (random.randint(50, 200), random.randint(50, 200), random.randint(50, 200))
-        self.is_in = True
-        self.is_grabbed = False
 
-    def update(self, dt, gravity, wind, air_density):
-        F_grav = gravity * self.mass
-        
-        v_rel = self.vel - wind
-        v_rel_mag = np.linalg.norm(v_rel)
-        F_drag = np.zeros(2)
-        if v_rel_mag > 0 and air_density > 0:
-            area = math.pi * (self.radius/10.0)**2
-            F_drag_mag = 0.5 * air_density * area * v_rel_mag**2
-            F_drag = -F_drag_mag * (v_rel / v_rel_mag)
-        
-        F_net = F_grav + F_drag
-        
-        accel = F_net / self.mass
-        self.vel += accel * dt
-        self.pos += self.vel * dt
+# --- Particle Store (structure of arrays, used by Particle Sandbox) ---
+_EMPTY_INDEX = np.zeros(0, dtype=np.intp)
+
+
+class ParticleSystem:
+    _COLUMNS = ('_pos', '_prev_pos', '_vel', '_radius', '_mass', '_color', '_is_in', '_is_grabbed',
+                '_asleep', '_sleep_timer', '_sleep_anchor', '_just_woke', '_supported', '_on_wall')
+
+    def __init__(self, capacity=256):
+        self.count = 0
+        self.capacity = 0
+        self._pos = np.zeros((0, 2), dtype=np.float64)
+        self._prev_pos = np.zeros((0, 2), dtype=np.float64)
+        self._vel = np.zeros((0, 2), dtype=np.float64)
+        self._radius = np.zeros(0, dtype=np.float64)
+        self._mass = np.zeros(0, dtype=np.float64)
+        self._color = np.zeros((0, 3), dtype=np.uint8)
+        self._is_in = np.zeros(0, dtype=bool)
+        self._is_grabbed = np.zeros(0, dtype=bool)
+        self._asleep = np.zeros(0, dtype=bool)
+        self._sleep_timer = np.zeros(0, dtype=np.float64)
+        self._sleep_anchor = np.zeros((0, 2), dtype=np.float64)
+        self._just_woke = np.zeros(0, dtype=bool)
+        self._supported = np.zeros(0, dtype=bool)
+        self._on_wall = np.zeros(0, dtype=bool)
+        self._reserve(capacity)
 
-    def check_container_collision(self, center, radius, container_angle, gap_angle, spin_speed):
-        if not self.is_in: 
+    def __len__(self):
+        return self.count
+
+    # Live views over the first `count` rows; writes go straight to the store.
+    @property
+    def pos(self): return self._pos[:self.count]
+    @property
+    def prev_pos(self): return self._prev_pos[:self.count]
+    @property
+    def vel(self): return self._vel[:self.count]
+    @property
+    def radius(self): return self._radius[:self.count]
+    @property
+    def mass(self): return self._mass[:self.count]
+    @property
+    def color(self): return self._color[:self.count]
+    @property
+    def is_in(self): return self._is_in[:self.count]
+    @property
+    def is_grabbed(self): return self._is_grabbed[:self.count]
+    @property
+    def asleep(self): return self._asleep[:self.count]
+    @property
+    def sleep_timer(self): return self._sleep_timer[:self.count]
+    @property
+    def sleep_anchor(self): return self._sleep_anchor[:self.count]
+    @property
+    def just_woke(self): return self._just_woke[:self.count]
+    @property
+    def supported(self): return self._supported[:self.count]
+    @property
+    def on_wall(self): return self._on_wall[:self.count]
+
+    def _reserve(self, capacity):
+        if capacity <= self.capacity:
             return
-            
-        dist_vec = self.pos - center
-        dist = np.linalg.norm(dist_vec)
-        
-        if dist + self.radius > radius:
-            ball_angle = math.atan2(dist_vec[1], dist_vec[0])
-            
-            gap_half_angle = gap_angle / 2
-            start_angle = (container_angle - gap_half_angle) % (2 * math.pi)
-            end_angle = (container_angle + gap_half_angle) % (2 * math.pi)
-            
-            is_in_gap = False
-            if start_angle > end_angle:
-                if ball_angle >= start_angle or ball_angle <= end_angle:
-                    is_in_gap = True
-            else:
-                if start_angle <= ball_angle <= end_angle:
-                    is_in_gap = True
-            
-            if is_in_gap:
-                self.is_in = False
-                return 
-            
-            self.is_in = True
-            
-            normal_vec = dist_vec / dist
-            self.pos = center + (radius - self.radius) * normal_vec 
-            
-            wall_vel_mag = radius * spin_speed
-            tangent_vec = np.array([-normal_vec[1], normal_vec[0]])
-            wall_vel = wall_vel_mag * tangent_vec
-            
-            v_rel = self.vel - wall_vel
-            elasticity = 0.85
-            v_rel_normal_comp = np.dot(v_rel, normal_vec)
-            
-            if v_rel_normal_comp > 0: 
-                v_reflect = v_rel - (1 + elasticity) * v_rel_normal_comp * normal_vec
-                self.vel = v_reflect + wall_vel
-
-    def is_mouse_over(self, mouse_pos):
-        return np.linalg.norm(self.pos - mouse_pos) < self.radius
-
-    def draw(self, screen):
-        color = BLUE if self.is_grabbed else self.color
-        pygame.draw.circle(screen, color, self.pos.astype(int), int(self.radius))
-        pygame.draw.circle(screen, DARK_GRAY, self.pos.astype(int), int(self.radius), 1)
-
-# --- Physics Functions (for Particle Sandbox) ---
-def resolve_particle_collision(ball1, ball2):
-    dist_vec = ball1.pos - ball2.pos
-    dist = np.linalg.norm(dist_vec)
-    if dist == 0 or dist > (ball1.radius + ball2.radius): return
-    
-    overlap = (ball1.radius + ball2.radius) - dist
-    ball1.pos += 0.5 * overlap * (dist_vec / dist)
-    ball2.pos -= 0.5 * overlap * (dist_vec / dist)
-    
-    normal_vec = dist_vec / dist
-    tangent_vec = np.array([-normal_vec[1], normal_vec[0]])
-    
-    v1_n = np.dot(ball1.vel, normal_vec)
-    v2_n = np.dot(ball2.vel, normal_vec)
-    v1_t = np.dot(ball1.vel, tangent_vec)
-    v2_t = np.dot(ball2.vel, tangent_vec)
-    
-    m1 = ball1.mass
-    m2 = ball2.mass
-    
-    v1_n_new = (v1_n * (m1 - m2) + 2 * m2 * v2_n) / (m1 + m2)
-    v2_n_new = (v2_n * (m2 - m1) + 2 * m1 * v1_n) / (m1 + m2)
-    
-    ball1.vel = (v1_n_new * normal_vec) + (v1_t * tangent_vec)
-    ball2.vel = (v2_n_new * normal_vec) + (v2_t * tangent_vec)
\ No newline at end of file
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def add(self, position, velocity, radius=8):
+        if self.count == self.capacity:
+            self._reserve(max(16, self.capacity * 2))
+        i = self.count
+        self._pos[i] = position
+        self._prev_pos[i] = position
+        self._vel[i] = velocity
+        self._radius[i] = radius
+        self._mass[i] = radius ** 2
+        # Colour channels from 50 to 200 in steps of 30, so the renderer only
+        # ever needs a few hundred sprites per radius.
+        self._color[i] = [50 + 30 * random.randint(0, 5) for _ in range(3)]
+        self._is_in[i] = True
+        self._is_grabbed[i] = False
+        self._asleep[i] = False
+        self._sleep_timer[i] = 0.0
+        self._sleep_anchor[i] = position
+        self._just_woke[i] = False
+        self._supported[i] = False
+        self._on_wall[i] = False
+        self.count += 1
+        return i
+
+    def remove(self, which):
+        # `which` is an index array or a boolean mask over the live particles.
+        # Live particles stay packed in [0, count): the slots freed inside
+        # that range are refilled from the tail (swap-remove), so the cost is
+        # proportional to the number removed, and freed tail slots are reused
+        # by add() without reallocating. Returns (moved_from, moved_to) so
+        # callers holding indices can remap them.
+        dead = np.zeros(self.count, dtype=bool)
+        dead[which] = True
+        removed = int(dead.sum())
+        if removed == 0:
+            return _EMPTY_INDEX, _EMPTY_INDEX
+        n = self.count - removed
+        moved_to = np.flatnonzero(dead[:n])
+        moved_from = n + np.flatnonzero(~dead[n:])
+        for name in self._COLUMNS:
+            arr = getattr(self, name)
+            arr[moved_to] = arr[moved_from]
+        self.count = n
+        return moved_from, moved_to
+
+    def clear(self):
+        self.count = 0
+
+    def snapshot(self):
+        self.prev_pos[:] = self.pos
+
+    def interpolated_pos(self, alpha):
+        # Render position between the last two physics states (alpha in [0, 1]).
+        return self.prev_pos + alpha * (self.pos - self.prev_pos)
+
+    def find_at(self, point):
+        # Topmost (last drawn) particle under the point, or None.
+        d2 = np.sum((self.pos - np.asarray(point, dtype=np.float64)) ** 2, axis=1)
+        hits = np.flatnonzero(d2 < self.radius ** 2)
+        return int(hits[-1]) if len(hits) else None
+
+    def update_sleep(self, dt, drift_ratio, sleep_time):
+        # A particle that stays within drift_ratio * radius of where it was
+        # sleep_time seconds ago is frozen and skipped by integration and
+        # collision until woken. Position drift is used rather than speed:
+        # in a pile the contact pushes keep velocities high while the
+        # particles only jiggle in place. Drift alone would also freeze a
+        # particle near the top of a slow arc, so it only falls asleep on a
+        # step where something holds it up: the wall, or a sleeper below
+        # (`supported`, set by the collision passes and cleared here).
+        awake = self.is_in & ~self.is_grabbed & ~self.asleep
+        offset = self.pos - self.sleep_anchor
+        drift = self.radius * drift_ratio
+        moved = awake & (np.sum(offset * offset, axis=1) > drift * drift)
+        self.sleep_anchor[moved] = self.pos[moved]
+        self.sleep_timer[moved] = 0.0
+        self.sleep_timer[awake & ~moved] += dt
+        settled = awake & self.supported & (self.sleep_timer >= sleep_time)
+        self.asleep[settled] = True
+        self.vel[settled] = 0.0
+        self.supported[:] = False
+
+    def wake(self, which):
+        woken = np.zeros(self.count, dtype=bool)
+        woken[which] = True
+        woken &= self.asleep
+        self.asleep[woken] = False
+        self.sleep_timer[woken] = 0.0
+        self.sleep_anchor[woken] = self.pos[woken]
+        self.just_woke[woken] = True
+
+    def wake_all(self):
+        self.wake(slice(None))
+
+    def integrate(self, dt, gravity, wind, air_density):
+        free = ~self.is_grabbed & ~self.asleep
+        vel = self.vel[free]
+        accel = np.broadcast_to(np.asarray(gravity, dtype=np.float64), vel.shape).copy()
+
+        if air_density > 0:
+            v_rel = vel - wind
+            v_rel_mag = np.sqrt(np.sum(v_rel * v_rel, axis=1))
+            radius = self.radius[free]
+            area = math.pi * (radius / 10.0) ** 2
+            # |F_drag| * v_rel_hat / m, written as k * |v_rel| * v_rel to avoid the division
+            k = 0.5 * air_density * area / self.mass[free]
+            accel -= (k * v_rel_mag)[:, None] * v_rel
+
+        vel += accel * dt
+        self.vel[free] = vel
+        self.pos[free] += vel * dt
+
+
+# --- Container Wall (batched, for Particle Sandbox) ---
+def collide_container(system, center, radius, container_angle, gap_angle, spin_speed, elasticity=0.85, swept=False):
+    # Returns a mask of the particles that left through the gap this step.
+    # Sleeping particles don't move, so only those that were against the
+    # wall when they fell asleep (`on_wall`) are tested, and only against
+    # the gap, never bounced.
+    # With `swept`, particles that crossed the wall during the step are judged
+    # (gap or bounce) where their path from prev_pos crossed it, so a fast
+    # particle can't skip past the gap edge or bounce at the wrong point.
+    pos, vel, r = system.pos, system.vel, system.radius
+    escaped = np.zeros(len(system), dtype=bool)
+    rows = np.flatnonzero(system.is_in & ~system.is_grabbed & (~system.asleep | system.on_wall))
+    if len(rows) == 0:
+        return escaped
+
+    r_rows = r[rows]
+    dist_vec = pos[rows] - center
+    dist = np.sqrt(np.sum(dist_vec * dist_vec, axis=1))
+    touching = (dist + r_rows > radius) & (dist > 0)
+
+    if swept:
+        start = system.prev_pos[rows] - center
+        inner = radius - r_rows
+        crossed = np.flatnonzero(touching & (np.sum(start * start, axis=1) < inner * inner))
+        if len(crossed):
+            p, m = start[crossed], pos[rows[crossed]] - system.prev_pos[rows[crossed]]
+            a = np.sum(m * m, axis=1)
+            b = 2.0 * np.sum(p * m, axis=1)
+            c = np.sum(p * p, axis=1) - inner[crossed] ** 2
+            t = (-b + np.sqrt(b * b - 4.0 * a * c)) / (2.0 * a)
+            dist_vec[crossed] = p + t[:, None] * m
+            dist[crossed] = np.sqrt(np.sum(dist_vec[crossed] ** 2, axis=1))
+
+    # Signed angle from the gap centre, wrapped to [-pi, pi).
+    ball_angle = np.arctan2(dist_vec[:, 1], dist_vec[:, 0])
+    offset = (ball_angle - container_angle + math.pi) % (2 * math.pi) - math.pi
+    in_gap = np.abs(offset) <= gap_angle / 2
+
+    escaped[rows[touching & in_gap]] = True
+    system.is_in[escaped] = False
+    wall = touching & ~in_gap
+    system.on_wall[rows] = wall
+    system.supported[rows[wall]] = True
+
+    local = np.flatnonzero(wall & ~system.asleep[rows])
+    if len(local) == 0:
+        return escaped
+    hit = rows[local]
+
+    normal = dist_vec[local] / dist[local, None]
+    pos[hit] = center + (radius - r[hit])[:, None] * normal
+
+    wall_vel = (radius * spin_speed) * np.column_stack((-normal[:, 1], normal[:, 0]))
+    v_rel = vel[hit] - wall_vel
+    v_rel_normal_comp = np.sum(v_rel * normal, axis=1)
+    outward = v_rel_normal_comp > 0
+    v_reflect = v_rel - ((1 + elasticity) * v_rel_normal_comp)[:, None] * normal
+    vel[hit] = np.where(outward[:, None], v_reflect + wall_vel, vel[hit])
+    return escaped
+
+
+# --- Broad Phase (candidate pairs for the Particle Sandbox) ---
+# Both return (i, j) index arrays with i < j, sorted by (i, j), so their
+# output can be compared directly and fed to the same narrow phase.
+def sort_pairs(i, j):
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def brute_force_pairs(pos, radius, block=256):
+    n = len(pos)
+    pairs_i, pairs_j = [], []
+    for start in range(0, n, block):
+        rows = np.arange(start, min(start + block, n))
+        d = pos[rows, None, :] - pos[None, :, :]
+        reach = radius[rows, None] + radius[None, :]
+        mask = np.sum(d * d, axis=2) <= reach * reach
+        mask &= np.arange(n)[None, :] > rows[:, None]
+        r, c = np.nonzero(mask)
+        pairs_i.append(rows[r])
+        pairs_j.append(c)
+    if not pairs_i:
+        return np.zeros(0, dtype=np.intp), np.zeros(0, dtype=np.intp)
+    return sort_pairs(np.concatenate(pairs_i), np.concatenate(pairs_j))
+
+
+_HASH_NEIGHBOURS = ((0, 0), (1, 0), (-1, 1), (0, 1), (1, 1))
+
+def spatial_hash_pairs(pos, radius, cell_size=None):
+    n = len(pos)
+    empty = np.zeros(0, dtype=np.intp)
+    if n < 2:
+        return empty, empty
+    if cell_size is None:
+        cell_size = 2.0 * float(radius.max())
+
+    cells = np.floor(pos / cell_size).astype(np.int64)
+    cx = cells[:, 0] + (1 << 20)
+    cy = cells[:, 1] + (1 << 20)
+    keys = (cx << 21) | cy
+
+    order = np.argsort(keys, kind='stable')
+    sorted_keys = keys[order]
+    cell_keys, cell_start, cell_count = np.unique(sorted_keys, return_index=True, return_counts=True)
+    cx, cy = cx[order], cy[order]
+    slot = np.arange(n)
+
+    pairs_a, pairs_b = [], []
+    # Half of the 3x3 neighbourhood, so every pair of cells is visited once.
+    for dx, dy in _HASH_NEIGHBOURS:
+        nkeys = ((cx + dx) << 21) | (cy + dy)
+        idx = np.minimum(np.searchsorted(cell_keys, nkeys), len(cell_keys) - 1)
+        found = cell_keys[idx] == nkeys
+        start = np.where(found, cell_start[idx], 0)
+        count = np.where(found, cell_count[idx], 0)
+        if dx == 0 and dy == 0:
+            # Same cell: only partners later in the sorted order.
+            end = start + count
+            start = slot + 1
+            count = end - start
+        total = int(count.sum())
+        if total == 0:
+            continue
+        a = np.repeat(slot, count)
+        within = np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+        b = np.repeat(start, count) + within
+        pairs_a.append(order[a])
+        pairs_b.append(order[b])
+
+    if not pairs_a:
+        return empty, empty
+    a = np.concatenate(pairs_a)
+    b = np.concatenate(pairs_b)
+    return sort_pairs(np.minimum(a, b), np.maximum(a, b))
+
+
+BROAD_PHASES = {
+    'brute': brute_force_pairs,
+    'grid': spatial_hash_pairs,
+}
+
+
+_CELL_NEIGHBOURS = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+
+def near_movers(pos, radius, movers):
+    # Mask of the movers plus every particle close enough to touch one, on
+    # a grid of the largest diameter: a touching pair is at most one cell
+    # apart. The broad phase only needs these rows while the rest sleep.
+    cells = np.floor(pos / (2.0 * float(radius.max()))).astype(np.int64) + (1 << 20)
+    keys = (cells[:, 0] << 21) | cells[:, 1]
+    around = (cells[movers][:, None, :] + _CELL_NEIGHBOURS[None]).reshape(-1, 2)
+    return movers | np.isin(keys, (around[:, 0] << 21) | around[:, 1])
+
+
+# --- Narrow Phase ---
+def touching_pairs(pos, radius, pairs_i, pairs_j):
+    d = pos[pairs_i] - pos[pairs_j]
+    r_sum = radius[pairs_i] + radius[pairs_j]
+    dist2 = np.sum(d * d, axis=1)
+    hit = (dist2 > 0) & (dist2 <= r_sum * r_sum)
+    return pairs_i[hit], pairs_j[hit]
+
+
+def independent_batches(pairs_i, pairs_j):
+    # Splits contacts into batches in which no particle appears twice, so each
+    # batch can be solved with array ops and the batches applied in turn give
+    # the same result as resolving the pairs one after another. Pairs are
+    # visited in a fixed hashed order; index order would chain neighbouring
+    # contacts and degrade to one pair per batch.
+    priority = (pairs_i.astype(np.uint64) * np.uint64(2654435761) + pairs_j.astype(np.uint64) * np.uint64(40503)) & np.uint64(0xFFFFFFFF)
+    remaining = np.argsort(priority, kind='stable')
+    n = int(max(pairs_i.max(), pairs_j.max())) + 1 if len(pairs_i) else 0
+    while len(remaining):
+        ends = np.column_stack((pairs_i[remaining], pairs_j[remaining])).ravel()
+        slots = np.arange(len(ends))
+        first = np.full(n, len(ends))
+        np.minimum.at(first, ends, slots)
+        is_first = first[ends] == slots
+        take = is_first[0::2] & is_first[1::2]
+        yield remaining[take]
+        remaining = remaining[~take]
+
+
+def resolve_collision_pairs(system, pairs_i, pairs_j, fixed=None):
+    # `fixed` marks particles that act as immovable supports (e.g. sleeping
+    # ones): their partner takes the whole push and loses its velocity into
+    # them, so it comes to rest on them instead of bouncing forever.
+    pos, vel, radius, mass = system.pos, system.vel, system.radius, system.mass
+    pairs_i, pairs_j = touching_pairs(pos, radius, pairs_i, pairs_j)
+    if len(pairs_i) == 0:
+        return 0
+
+    for batch in independent_batches(pairs_i, pairs_j):
+        i, j = pairs_i[batch], pairs_j[batch]
+        dist_vec = pos[i] - pos[j]
+        dist = np.sqrt(np.sum(dist_vec * dist_vec, axis=1))
+        r_sum = radius[i] + radius[j]
+        # Earlier batches may already have pushed these apart.
+        hit = (dist > 0) & (dist <= r_sum)
+        i, j, dist_vec, dist, r_sum = i[hit], j[hit], dist_vec[hit], dist[hit], r_sum[hit]
+
+        normal = dist_vec / dist[:, None]
+        overlap = r_sum - dist
+
+        # Fraction of the overlap / relative velocity change each side takes.
+        push_i = np.full(len(i), 0.5)
+        share_i = mass[j] / (mass[i] + mass[j])
+        if fixed is not None:
+            fixed_i, fixed_j = fixed[i], fixed[j]
+            push_i[fixed_j] = 1.0
+            push_i[fixed_i] = 0.0
+            share_i[fixed_j] = 1.0
+            share_i[fixed_i] = 0.0
+        share_j = 1.0 - share_i
+
+        # Elastic exchange flips the normal relative velocity.
+        v_rel_n = np.sum((vel[i] - vel[j]) * normal, axis=1)
+        bounce = np.full(len(i), 2.0)
+        if fixed is not None:
+            against = fixed_i | fixed_j
+            bounce[against] = v_rel_n[against] < 0
+        dv = (-bounce * v_rel_n)[:, None] * normal
+
+        pos[i] += (push_i * overlap)[:, None] * normal
+        pos[j] -= ((1.0 - push_i) * overlap)[:, None] * normal
+        vel[i] += share_i[:, None] * dv
+        vel[j] -= share_j[:, None] * dv
+
+    return len(pairs_i)
+
+
+# --- Continuous Collision (swept circles, for Particle Sandbox) ---
+def swept_pairs(start, motion, radius, fast, brute_rows=64):
+    # Pairs (i < j) with at least one fast particle whose swept circles may
+    # meet. A swept circle fits inside the circle around its path's midpoint.
+    n = len(start)
+    mid = start + 0.5 * motion
+    reach = radius + 0.5 * np.sqrt(np.sum(motion * motion, axis=1))
+    rows = np.flatnonzero(fast)
+    if len(rows) > brute_rows:
+        pairs_i, pairs_j = spatial_hash_pairs(mid, reach)
+        keep = fast[pairs_i] | fast[pairs_j]
+        return pairs_i[keep], pairs_j[keep]
+
+    # Few fast particles (a thrown one, say): test them against everything.
+    d = mid[rows, None, :] - mid[None, :, :]
+    limit = reach[rows, None] + reach[None, :]
+    mask = np.sum(d * d, axis=2) <= limit * limit
+    mask[np.arange(len(rows)), rows] = False
+    r, c = np.nonzero(mask)
+    a, b = rows[r], c
+    keys = np.unique(np.minimum(a, b).astype(np.int64) * n + np.maximum(a, b))
+    return (keys // n).astype(np.intp), (keys % n).astype(np.intp)
+
+
+def time_of_impact(start, motion, radius, pairs_i, pairs_j, overlap=0.0):
+    # Fraction of the step at which each pair first closes to
+    # (1 - overlap) * (r_i + r_j); inf if it never does, or already had.
+    p = start[pairs_i] - start[pairs_j]
+    d = motion[pairs_i] - motion[pairs_j]
+    reach = (1.0 - overlap) * (radius[pairs_i] + radius[pairs_j])
+    a = np.sum(d * d, axis=1)
+    b = 2.0 * np.sum(p * d, axis=1)
+    c = np.sum(p * p, axis=1) - reach * reach
+    disc = b * b - 4.0 * a * c
+
+    t = np.full(len(pairs_i), np.inf)
+    closing = (c > 0) & (b < 0) & (disc >= 0)
+    t[closing] = (-b[closing] - np.sqrt(disc[closing])) / (2.0 * a[closing])
+    t[t > 1.0] = np.inf
+    return t
+
+
+def clamp_tunneling(system, fast_ratio=1.0, overlap=0.02, exclude=None, still=None):
+    # Conservative advancement for particles that moved more than fast_ratio
+    # radii this step: everything involved in a swept contact is pulled back
+    # along its path to its earliest time of impact, just inside contact, so
+    # the discrete narrow phase sees the collision instead of missing it.
+    # `still` rows (sleepers) are never checked for speed but can be hit.
+    # Returns the number of particles pulled back.
+    start, radius = system.prev_pos, system.radius
+    rows = np.arange(len(system)) if still is None else np.flatnonzero(~still)
+    if exclude is not None:
+        rows = rows[~exclude[rows]]
+    step = system.pos[rows] - start[rows]
+    rows = rows[np.sum(step * step, axis=1) > (fast_ratio * radius[rows]) ** 2]
+    if len(rows) == 0:
+        return 0
+    motion = system.pos - start
+    fast = np.zeros(len(system), dtype=bool)
+    fast[rows] = True
+
+    pairs_i, pairs_j = swept_pairs(start, motion, radius, fast)
+    if exclude is not None:
+        keep = ~exclude[pairs_i] & ~exclude[pairs_j]
+        pairs_i, pairs_j = pairs_i[keep], pairs_j[keep]
+    t = time_of_impact(start, motion, radius, pairs_i, pairs_j, overlap)
+    hit = np.isfinite(t)
+    if not hit.any():
+        return 0
+
+    first = np.ones(len(system))
+    np.minimum.at(first, pairs_i[hit], t[hit])
+    np.minimum.at(first, pairs_j[hit], t[hit])
+    pulled = np.flatnonzero(first < 1.0)
+    system.pos[pulled] = start[pulled] + first[pulled, None] * motion[pulled]
+    return len(pulled)
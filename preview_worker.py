@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from constants import *
+
+
+class PreviewWorker:
+    # Runs compute(*args, cancelled=...) on a daemon thread for the newest
+    # request only. Submitting replaces a request that has not started yet
+    # and cancels one that is running, and work starts at most once per
+    # `interval`, so dragging a slider never queues up stale flights.
+    def __init__(self, compute, interval=PREVIEW_INTERVAL):
+        self.compute = compute
+        self.interval = interval
+        self.condition = threading.Condition()
+        self.pending = None
+        self.generation = 0
+        self.result = None
+        self.completed = 0
+        self.cancelled = 0
+        self.thread = None
+
+    def submit(self, key, *args):
+        with self.condition:
+            self.generation += 1
+            self.pending = (self.generation, key, args)
+            self.condition.notify()
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="preview", daemon=True)
+            self.thread.start()
+
+    def latest(self):
+        # (key, value) of the most recent finished request, or None.
+        return self.result
+
+    def _run(self):
+        last_start = -self.interval
+        while True:
+            with self.condition:
+                while self.pending is None:
+                    self.condition.wait()
+            wait = last_start + self.interval - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+
+            with self.condition:
+                generation, key, args = self.pending
+                self.pending = None
+            last_start = time.perf_counter()
+            value = self.compute(*args, cancelled=lambda: generation != self.generation)
+            if value is None:
+                self.cancelled += 1
+                continue
+            self.result = (key, value)
+            self.completed += 1
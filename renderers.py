@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import pygame
+import numpy as np
+from constants import *
+
+
+class ParticleRenderer:
+    # Pre-rasterized (radius, color) sprites, drawn in one Surface.blits call.
+    def __init__(self, outline=DARK_GRAY, max_sprites=4096):
+        self.outline = outline
+        self.max_sprites = max_sprites
+        self.sprites = {}
+
+    def sprite(self, key):
+        sprite = self.sprites.get(key)
+        if sprite is None:
+            if len(self.sprites) >= self.max_sprites:
+                self.sprites.clear()
+            radius = key >> 24
+            color = ((key >> 16) & 0xFF, (key >> 8) & 0xFF, key & 0xFF)
+            sprite = pygame.Surface((2 * radius + 1, 2 * radius + 1))
+            sprite.fill(LAYER_COLOR_KEY)
+            pygame.draw.circle(sprite, color, (radius, radius), radius)
+            pygame.draw.circle(sprite, self.outline, (radius, radius), radius, 1)
+            sprite.set_colorkey(LAYER_COLOR_KEY, pygame.RLEACCEL)
+            self.sprites[key] = sprite
+        return sprite
+
+    def draw(self, surface, pos, radius, color):
+        if len(pos) == 0:
+            return
+        radius = np.maximum(radius.astype(np.int64), 1)
+        color = color.astype(np.int64)
+        keys = (radius << 24) | (color[:, 0] << 16) | (color[:, 1] << 8) | color[:, 2]
+        unique_keys, which = np.unique(keys, return_inverse=True)
+        sprites = [self.sprite(int(key)) for key in unique_keys]
+
+        corners = (pos.astype(np.int64) - radius[:, None]).tolist()
+        surface.blits([(sprites[k], corner) for k, corner in zip(which.tolist(), corners)], doreturn=False)
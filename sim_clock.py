@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import math
+from constants import *
+
+
+class SimulationClock:
+    def __init__(self, physics_hz=FPS, max_catchup_frames=MAX_CATCHUP_FRAMES):
+        self.max_catchup_frames = max_catchup_frames
+        self.accumulator = 0.0
+        self.alpha = 0.0
+        self.dropped_time = 0.0
+        self.set_rate(physics_hz)
+
+    def set_rate(self, physics_hz):
+        self.physics_hz = physics_hz
+        self.dt = 1.0 / physics_hz
+        # Never run more than a couple of frames' worth of steps in one frame,
+        # otherwise a slow frame makes the next one slower (spiral of death).
+        self.max_substeps = max(1, math.ceil(self.max_catchup_frames * physics_hz / FPS))
+
+    def reset(self):
+        self.accumulator = 0.0
+        self.alpha = 0.0
+
+    def advance(self, frame_time):
+        self.accumulator += frame_time
+        steps = int(self.accumulator / self.dt)
+        if steps > self.max_substeps:
+            self.dropped_time += (steps - self.max_substeps) * self.dt
+            steps = self.max_substeps
+            self.accumulator = self.max_substeps * self.dt
+        self.accumulator -= steps * self.dt
+        # How far the display sits between the last two physics states.
+        self.alpha = self.accumulator / self.dt
+        return steps
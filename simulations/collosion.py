@@ -3,11 +3,15 @@ import pygame
 import math
 import numpy as np
 import random
+import time
 
 
 from constants import *
 from gui_components import Slider, Button, CheckBox, TextBox, Graph
-from physics_engine import Particle, resolve_particle_collision
+from sim_clock import SimulationClock
+from renderers import ParticleRenderer
+from parallel_collisions import ParallelCollisionSolver
+from physics_engine import ParticleSystem, BROAD_PHASES, near_movers, collide_container, clamp_tunneling, touching_pairs, resolve_collision_pairs
 
 class ParticleSandbox:
     def __init__(self, screen, screen_rect, fonts):
@@ -22,7 +26,9 @@ class ParticleSandbox:
         self.ui_rect = pygame.Rect(1000, 0, 300, screen_rect.height)
         
         self.simulation_running = True
-        self.particles = []
+        self.particles = ParticleSystem()
+        self.renderer = ParticleRenderer()
+        self.sim_clock = SimulationClock(SANDBOX_PHYSICS_HZ)
         
         
         self.container_center = np.array([self.sim_rect.centerx, self.sim_rect.centery], dtype=np.float64)
@@ -36,8 +42,18 @@ class ParticleSandbox:
         self.spawn_pos = np.array([self.container_center[0], self.container_center[1] - self.container_radius // 2], dtype=np.float64)
         self.spawn_vel_variance = 20
         self.spawner_active = True
+        self.gravity = DEFAULT_GRAVITY_PX
+        self.sleeping_enabled = True
         
-        self.grabbed_object = None
+        self.grabbed_index = None
+        self.broad_phase = 'grid'
+        self.candidate_pairs = 0
+        self.parallel_enabled = False
+        self.ccd_enabled = True
+        self.parallel_solver = None
+        self.contact_pairs = 0
+        self.escaped_count = 0
+        self.phase_times = {'integrate': 0.0, 'wall': 0.0, 'ccd': 0.0, 'pairs': 0.0, 'removal': 0.0, 'sleep': 0.0}
         self.active_textbox = None
         self.graph_timer = 0.0
 
@@ -78,15 +94,26 @@ class ParticleSandbox:
         self.textboxes['gap_angle'] = TextBox(panel_x + w + 10, y_pos, 70, 30, "60.0", self.font_medium)
         y_pos += 50
 
+        self.sliders['physics_hz'] = Slider(panel_x, y_pos, w, 20, 30.0, 480.0, SANDBOX_PHYSICS_HZ, "Physics Rate", "Hz")
+        self.textboxes['physics_hz'] = TextBox(panel_x + w + 10, y_pos, 70, 30, str(float(SANDBOX_PHYSICS_HZ)), self.font_medium)
+        y_pos += 50
+
         self.buttons['toggle_pause'] = Button(panel_x, y_pos, (panel_w - 10) // 2, 40, "PAUSE", RED)
         self.buttons['clear'] = Button(panel_x + (panel_w + 10) // 2, y_pos, (panel_w - 10) // 2, 40, "CLEAR", BLUE)
         y_pos += 50
         
         self.particle_count_graph = Graph(
-            pygame.Rect(panel_x, y_pos, panel_w, 150),
+            pygame.Rect(panel_x, y_pos, panel_w, 100),
             "Time (s)", "Particle Count", self.font_small, 200
         )
-        y_pos += 160
+        y_pos += 110
+        
+        self.checkboxes['spatial_hash'] = CheckBox(panel_x, y_pos, 20, 20, "Spatial Hash", self.font_medium, True)
+        self.checkboxes['sleeping'] = CheckBox(panel_x + 140, y_pos, 20, 20, "Sleeping", self.font_medium, True)
+        y_pos += 30
+        self.checkboxes['parallel'] = CheckBox(panel_x, y_pos, 20, 20, "Multi-core", self.font_medium, False)
+        self.checkboxes['ccd'] = CheckBox(panel_x + 140, y_pos, 20, 20, "Swept (CCD)", self.font_medium, True)
+        y_pos += 35
         self.data_readout_y = y_pos
 
         
@@ -126,7 +153,9 @@ class ParticleSandbox:
                             self.buttons['toggle_pause'].text = "PAUSE" if self.simulation_running else "RESUME"
                             self.buttons['toggle_pause'].color = RED if self.simulation_running else GREEN
                         elif self.buttons['clear'].is_over(mouse_pos):
-                            self.particles = []
+                            self.particles.clear()
+                            self.grabbed_index = None
+                            self.escaped_count = 0
                             self.particle_count_graph.clear_data()
                         elif self.buttons['back'].is_over(mouse_pos):
                             return 'main_menu'
@@ -136,17 +165,17 @@ class ParticleSandbox:
                                 cb.toggle()
                 
                 if self.sim_rect.collidepoint(mouse_pos) and not self.active_textbox:
-                    for particle in reversed(self.particles):
-                        if particle.is_mouse_over(mouse_pos):
-                            self.grabbed_object = particle
-                            self.grabbed_object.is_grabbed = True
-                            self.grabbed_object.vel = np.zeros(2)
-                            break
+                    index = self.particles.find_at(mouse_pos)
+                    if index is not None:
+                        self.grabbed_index = index
+                        self.particles.wake([index])
+                        self.particles.is_grabbed[index] = True
+                        self.particles.vel[index] = 0.0
 
             if event.type == pygame.MOUSEBUTTONUP and event.button == 1:
-                if self.grabbed_object:
-                    self.grabbed_object.is_grabbed = False
-                    self.grabbed_object = None
+                if self.grabbed_index is not None:
+                    self.particles.is_grabbed[self.grabbed_index] = False
+                    self.grabbed_index = None
                 
                 for slider in self.sliders.values():
                     if slider.dragging:
@@ -156,9 +185,10 @@ class ParticleSandbox:
             
             if event.type == pygame.MOUSEMOTION:
                 mouse_pos = event.pos
-                if self.grabbed_object:
-                    self.grabbed_object.pos = np.array(mouse_pos, dtype=np.float64)
-                    self.grabbed_object.vel = np.array(event.rel, dtype=np.float64) * 5.0
+                if self.grabbed_index is not None:
+                    self.particles.pos[self.grabbed_index] = mouse_pos
+                    self.particles.prev_pos[self.grabbed_index] = mouse_pos
+                    self.particles.vel[self.grabbed_index] = np.array(event.rel, dtype=np.float64) * 5.0
                 
                 for key, slider in self.sliders.items():
                     if slider.dragging:
@@ -167,7 +197,7 @@ class ParticleSandbox:
             
             if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 mouse_pos = event.pos
-                if self.ui_rect.collidepoint(mouse_pos) and not self.active_textbox and not self.grabbed_object:
+                if self.ui_rect.collidepoint(mouse_pos) and not self.active_textbox and self.grabbed_index is None:
                     for slider in self.sliders.values():
                         if slider.is_over(mouse_pos):
                             slider.dragging = True
@@ -175,60 +205,162 @@ class ParticleSandbox:
         return None 
 
     def spawn_particle(self):
-        vel_var = self.sliders['spawn_vel'].get_value()
+        vel_var = self.spawn_vel_variance
         vel = np.array([random.uniform(-vel_var, vel_var), 
                         random.uniform(-vel_var, vel_var)], dtype=np.float64)
         
-        new_particle = Particle(self.spawn_pos.copy(), vel)
-        new_particle.radius = 8
-        new_particle.mass = new_particle.radius**2
-        self.particles.append(new_particle)
+        self.particles.add(self.spawn_pos, vel, radius=8)
 
-    def update_simulation(self):
+    def update_simulation(self, dt=DT):
         if not self.simulation_running:
             return
             
+        self.read_controls()
+        self.step(dt)
+            
+        self.graph_timer += dt
+        if self.graph_timer >= 0.5:
+            self.graph_timer = 0
+            self.particle_count_graph.add_data_point(pygame.time.get_ticks() / 1000.0, len(self.particles))
+
+    def read_controls(self):
         self.spawner_active = self.checkboxes['spawner_active'].checked
+        self.broad_phase = 'grid' if self.checkboxes['spatial_hash'].checked else 'brute'
+        self.parallel_enabled = self.checkboxes['parallel'].checked
+        self.ccd_enabled = self.checkboxes['ccd'].checked
         self.spawn_rate = self.sliders['spawn_rate'].get_value()
+        self.spawn_vel_variance = self.sliders['spawn_vel'].get_value()
+        
+        # Anything that changes the forces on a resting pile wakes it up.
+        environment = (self.gravity, self.container_spin_speed, self.container_gap_angle)
+        self.gravity = self.sliders['gravity'].get_value()
         self.container_spin_speed = self.sliders['spin_speed'].get_value()
         self.container_gap_angle = math.radians(self.sliders['gap_angle'].get_value())
+        if environment != (self.gravity, self.container_spin_speed, self.container_gap_angle):
+            self.particles.wake_all()
         
-        gravity_vec = np.array([0, self.sliders['gravity'].get_value()], dtype=np.float64)
-        
+        self.sleeping_enabled = self.checkboxes['sleeping'].checked
+        if not self.sleeping_enabled:
+            self.particles.wake_all()
+        physics_hz = round(self.sliders['physics_hz'].get_value())
+        if physics_hz != self.sim_clock.physics_hz:
+            self.sim_clock.set_rate(physics_hz)
+
+    def step(self, dt):
         if self.spawner_active:
-            self.spawn_timer += DT
+            self.spawn_timer += dt
             if self.spawn_timer >= 1.0 / self.spawn_rate:
                 self.spawn_timer = 0
                 self.spawn_particle()
         
-        self.container_angle = (self.container_angle + self.container_spin_speed * DT) % (2 * math.pi)
+        self.container_angle = (self.container_angle + self.container_spin_speed * dt) % (2 * math.pi)
+        gravity_vec = np.array([0, self.gravity], dtype=np.float64)
+        particles = self.particles
+        particles.snapshot()
         
-        particles_to_remove = []
-        for i, particle in enumerate(self.particles):
-            if particle.is_grabbed:
-                continue
-                
-            particle.update(DT, gravity_vec, np.zeros(2), 0.0) # No wind/drag for this one
-            
-            particle.check_container_collision(self.container_center, self.container_radius, self.container_angle, self.container_gap_angle, self.container_spin_speed)
-            
-            for j in range(i + 1, len(self.particles)):
-                particle2 = self.particles[j]
-                if particle2.is_grabbed:
-                    continue
-                resolve_particle_collision(particle, particle2)
-            
-            if not self.sim_rect.collidepoint(particle.pos) and particle.is_in == False:
-                particles_to_remove.append(particle)
+        t0 = time.perf_counter()
+        particles.integrate(dt, gravity_vec, np.zeros(2), 0.0) # No wind/drag for this one
+        
+        t1 = time.perf_counter()
+        escaped = collide_container(particles, self.container_center, self.container_radius, self.container_angle, self.container_gap_angle, self.container_spin_speed,
+                                    swept=self.ccd_enabled)
+        self.escaped_count += int(np.count_nonzero(escaped))
+        particles.wake(escaped)
+        
+        t2 = time.perf_counter()
+        if self.ccd_enabled:
+            clamp_tunneling(particles, exclude=particles.is_grabbed, still=particles.asleep)
+        
+        t3 = time.perf_counter()
+        self.collide_particles()
+        
+        t4 = time.perf_counter()
+        self.remove_lost_particles()
+        
+        t5 = time.perf_counter()
+        if self.sleeping_enabled:
+            particles.update_sleep(dt, SLEEP_DRIFT_RATIO, SLEEP_TIME)
+        
+        t6 = time.perf_counter()
+        self.phase_times['integrate'] = t1 - t0
+        self.phase_times['wall'] = t2 - t1
+        self.phase_times['ccd'] = t3 - t2
+        self.phase_times['pairs'] = t4 - t3
+        self.phase_times['removal'] = t5 - t4
+        self.phase_times['sleep'] = t6 - t5
 
-        for particle in particles_to_remove:
-            if particle in self.particles:
-                self.particles.remove(particle)
-            
-        self.graph_timer += DT
-        if self.graph_timer >= 0.5:
-            self.graph_timer = 0
-            self.particle_count_graph.add_data_point(pygame.time.get_ticks() / 1000.0, len(self.particles))
+    def remove_lost_particles(self):
+        particles = self.particles
+        x, y = particles.pos[:, 0], particles.pos[:, 1]
+        on_screen = (x >= self.sim_rect.left) & (x < self.sim_rect.right) & (y >= self.sim_rect.top) & (y < self.sim_rect.bottom)
+        lost = ~particles.is_in & ~particles.is_grabbed & ~on_screen
+        if not lost.any():
+            return
+        moved_from, moved_to = particles.remove(lost)
+        if self.grabbed_index is not None:
+            moved = np.flatnonzero(moved_from == self.grabbed_index)
+            if len(moved):
+                self.grabbed_index = int(moved_to[moved[0]])
+
+    def collide_particles(self):
+        # Sleepers only take part as something a mover can hit, so the broad
+        # phase runs on the movers and the sleepers within reach of them.
+        particles = self.particles
+        asleep = particles.asleep
+        rows = None
+        if asleep.any():
+            rows = np.flatnonzero(near_movers(particles.pos, particles.radius, ~asleep))
+        solver = None
+        if rows is not None and len(rows) < 2:
+            pairs_i = pairs_j = np.zeros(0, dtype=np.intp)
+        elif self.parallel_enabled and len(particles) >= PARALLEL_MIN_PARTICLES:
+            if self.parallel_solver is None:
+                self.parallel_solver = ParallelCollisionSolver()
+            solver = self.parallel_solver
+            pairs_i, pairs_j = solver.find_pairs(particles, rows)
+        elif rows is None:
+            pairs_i, pairs_j = BROAD_PHASES[self.broad_phase](particles.pos, particles.radius)
+        else:
+            pairs_i, pairs_j = BROAD_PHASES[self.broad_phase](particles.pos[rows], particles.radius[rows])
+            pairs_i, pairs_j = rows[pairs_i], rows[pairs_j]
+        free = ~particles.is_grabbed
+        keep = free[pairs_i] & free[pairs_j] & ~(asleep[pairs_i] & asleep[pairs_j])
+        pairs_i, pairs_j = pairs_i[keep], pairs_j[keep]
+        self.candidate_pairs = len(pairs_i)
+        
+        self.wake_on_contact(pairs_i, pairs_j)
+        if solver is not None:
+            self.contact_pairs = solver.resolve(particles, pairs_i, pairs_j, fixed=particles.asleep)
+        else:
+            self.contact_pairs = resolve_collision_pairs(particles, pairs_i, pairs_j, fixed=particles.asleep)
+
+    def wake_on_contact(self, pairs_i, pairs_j):
+        particles = self.particles
+        asleep = particles.asleep
+        recently_woken = particles.just_woke.copy()
+        particles.just_woke[:] = False
+        
+        mixed = asleep[pairs_i] != asleep[pairs_j]
+        i, j = touching_pairs(particles.pos, particles.radius, pairs_i[mixed], pairs_j[mixed])
+        if len(i) == 0:
+            return
+        sleeper = np.where(asleep[i], i, j)
+        waker = np.where(asleep[i], j, i)
+        
+        # A particle moving into a sleeper wakes it; only the jiggle of a
+        # settling pile (approach speed under WAKE_SPEED_PX) does not, and
+        # resolve_collision_pairs brings that to rest against the sleeper.
+        # A particle that just woke also wakes whatever rests on top of it,
+        # so piles don't hang in mid-air when their support falls away.
+        toward = particles.pos[sleeper] - particles.pos[waker]
+        distance = np.sqrt(np.sum(toward * toward, axis=1))
+        approach = np.sum(particles.vel[waker] * toward, axis=1) / np.maximum(distance, 1e-12)
+        gravity_vec = np.array([0, self.gravity], dtype=np.float64)
+        below = np.sum(toward * gravity_vec, axis=1)
+        woken = (approach > WAKE_SPEED_PX) | (recently_woken[waker] & (below < 0))
+        particles.wake(sleeper[woken])
+        # An awake particle lying on a sleeper that stays asleep is held up.
+        particles.supported[waker[~woken & (below > 0)]] = True
 
     def sync_widgets(self, source_type, key):
         try:
@@ -243,11 +375,11 @@ class ParticleSandbox:
         except (ValueError, KeyError):
             pass
 
-    def draw_all(self):
-        self.draw_simulation_area()
+    def draw_all(self, alpha=1.0):
+        self.draw_simulation_area(alpha)
         self.draw_gui_panel()
 
-    def draw_simulation_area(self):
+    def draw_simulation_area(self, alpha=1.0):
         self.screen.set_clip(self.sim_rect)
         
         pygame.draw.rect(self.screen, BLACK, self.sim_rect)
@@ -262,8 +394,10 @@ class ParticleSandbox:
         p2 = self.container_center + (self.container_radius + self.sim_rect.width) * np.array([math.cos(end_angle), math.sin(end_angle)])
         pygame.draw.polygon(self.screen, BLACK, [self.container_center.astype(int), p1.astype(int), p2.astype(int)], 0)
         
-        for particle in self.particles:
-            particle.draw(self.screen)
+        particles = self.particles
+        colors = particles.color.copy()
+        colors[particles.is_grabbed] = BLUE
+        self.renderer.draw(self.screen, particles.interpolated_pos(alpha), particles.radius, colors)
         
         if self.spawner_active:
             pygame.draw.circle(self.screen, BLUE, self.spawn_pos.astype(int), 5)
@@ -279,7 +413,7 @@ class ParticleSandbox:
         title_text = self.font_large.render("Particle Sandbox", True, BLACK)
         self.screen.blit(title_text, (self.ui_rect.centerx - title_text.get_width() // 2, self.ui_rect.y + 20))
         
-        active_panel_rect = (self.ui_rect.x + 10, self.ui_rect.y + 80, self.ui_rect.width - 20, 390)
+        active_panel_rect = (self.ui_rect.x + 10, self.ui_rect.y + 80, self.ui_rect.width - 20, 440)
         pygame.draw.rect(self.screen, GRAPH_BG, active_panel_rect, border_radius=5)
 
         for widget in self.sliders.values(): widget.draw(self.screen, self.font_small)
@@ -295,6 +429,9 @@ class ParticleSandbox:
         
         data = [
             f"Total Particles: {len(self.particles)}",
+            f"Pairs (candidates/contacts): {self.candidate_pairs} / {self.contact_pairs}",
+            f"Escaped Through Gap: {self.escaped_count}",
+            f"Sleeping: {int(np.count_nonzero(self.particles.asleep))}",
         ]
 
         for line in data:
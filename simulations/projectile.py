@@ -1,12 +1,22 @@
 # -*- coding: utf-8 -*-
 import pygame
 import math
+import os
+import time
 import numpy as np
 
 
 from constants import *
 from gui_components import Adv_Slider, Adv_Button, Adv_TabButton, Adv_CheckBox, Adv_TextBox, Adv_Graph
-from physics_engine import Adv_Projectile, Adv_IdealProjectile
+from physics_engine import Adv_Projectile, Adv_ProjectileReplay, Adv_IdealProjectile
+from sim_clock import SimulationClock
+from trajectory_cache import Flight, TrajectoryCache, trajectory_key, quantize
+from preview_worker import PreviewWorker
+from trajectory_trails import TrailHistory, project, simplify, clip_polyline
+from renderers import ParticleRenderer
+from flight_telemetry import FlightTelemetry, CHANNELS, CHANNEL_LABELS
+from terrain import Terrain
+import ballistics
 
 
 def adv_to_screen_coords(pos_m, zoom, origin):
@@ -34,25 +44,93 @@ class AdvancedProjectileLab:
         self.ui_rect = pygame.Rect(900, 0, 400, screen_rect.height)
 
         self.simulation_running = False
+        self.sim_clock = SimulationClock(FPS)
         
         self.last_projectile = None
         self.last_ideal_projectile = None
-        self.trajectories = []
-        self.ideal_trajectories = []
+        self.trajectories = TrailHistory()
+        self.ideal_trajectories = TrailHistory()
+        
+        # Finished flights are kept by launch settings, so repeating a launch
+        # replays the recording instead of integrating it again.
+        self.trajectory_cache = TrajectoryCache()
+        self.flight_key = None
+        self.flight_samples = []
+        
+        self.preview_worker = PreviewWorker(ballistics.flight_path)
+        self.preview_key = None
+        self.preview_path = None
+        self.preview_source = None
+        self.preview_runs = []
+        self.preview_runs_key = None
+        self.preview_end = None
+        
+        # Salvo shells fly as rows of one batch, stepped and drawn together and
+        # independent of the single launch.
+        self.salvo = None
+        self.salvo_prev = None
+        self.salvo_renderer = ParticleRenderer()
+        self.salvo_rng = np.random.default_rng()
+        self.salvo_ms = 0.0
+        
+        # Every step of the current flight, kept for the graph and for export.
+        self.telemetry = None
+        self.graph_channel = 'y'
+        self.export_message = None
         
         self.target_pos_m = None
         self.target_radius_m = 2.0
         self.hit_target = False
         
         
+        self.trail_layer = pygame.Surface(self.sim_rect.size)
+        self.trail_layer.set_colorkey(LAYER_COLOR_KEY, pygame.RLEACCEL)
+        self.trail_layer_key = None
+        self.background = None
+        self.background_key = None
+        
         self.SIM_AREA_WIDTH = self.sim_rect.width
         self.GROUND_Y = self.sim_rect.height - 70
         self.CANNON_ORIGIN_PIX = (self.sim_rect.x + 60, self.GROUND_Y)
         self.PIXELS_PER_METER = 5.0
 
+        # Ground shapes to cycle through; a heightfield saved at TERRAIN_FILE
+        # is offered as well.
+        self.terrains = [Terrain.flat(), Terrain.hills(), Terrain.hills(amplitude=120.0, seed=3, name="Mountains")]
+        if os.path.exists(TERRAIN_FILE):
+            try:
+                self.terrains.append(Terrain.load(TERRAIN_FILE))
+            except (OSError, ValueError):
+                pass
+        self.terrain = self.terrains[0]
+        
         self.create_gui_elements()
         self.active_textbox = None
         self.active_tab = 'projectile'
+        
+        self.sweep_metric = 'range'
+        # Sweeps and their refine run on a worker thread; sweep_key is the
+        # result on show, sweep_requested the one asked for most recently.
+        self.sweep_worker = PreviewWorker(ballistics.sweep_optimum)
+        self.sweep_requested = None
+        self.sweep_started = 0.0
+        self.sweep_key = None
+        self.sweep_result = None
+        self.sweep_best = None
+        self.sweep_ms = 0.0
+        self.solver_lines = []
+        
+        # Dispersion runs are stepped a little every frame from a generator,
+        # so a 100k-launch run never holds up drawing or input.
+        self.dispersion_counts = [10000, 50000, 100000]
+        self.dispersion_total = 100000
+        self.dispersion_run = None
+        self.dispersion_chunks = []
+        self.dispersion_impacts = None
+        self.dispersion_percentiles = None
+        self.dispersion_ms = 0.0
+        self.dispersion_bars = []
+        self.dispersion_bars_key = None
 
     def create_gui_elements(self):
         self.sliders = {}
@@ -64,17 +142,26 @@ class AdvancedProjectileLab:
         self.widgets_by_tab = {
             'projectile': [],
             'environment': [],
-            'view': []
+            'view': [],
+            'analysis': [],
+            'dispersion': []
         }
         
         panel_x = self.ui_rect.x + 20
         panel_w = self.ui_rect.width - 40
         
      
-        tab_w = self.ui_rect.width // 3
-        self.tab_buttons['projectile'] = Adv_TabButton(self.ui_rect.x, 40, tab_w, 30, "Projectile", self.font_medium)
-        self.tab_buttons['environment'] = Adv_TabButton(self.ui_rect.x + tab_w, 40, tab_w, 30, "Environment", self.font_medium)
-        self.tab_buttons['view'] = Adv_TabButton(self.ui_rect.x + 2 * tab_w, 40, tab_w, 30, "View", self.font_medium)
+        # Five tabs do not fit at equal widths, so each gets its label width
+        # plus an equal share of the space left over.
+        tabs = [('projectile', "Projectile"), ('environment', "Environment"), ('view', "View"),
+                ('analysis', "Analysis"), ('dispersion', "Dispersion")]
+        label_w = [self.font_medium.size(label)[0] for _, label in tabs]
+        spare = (self.ui_rect.width - sum(label_w)) // len(tabs)
+        tab_x = self.ui_rect.x
+        for (key, label), text_w in zip(tabs, label_w):
+            tab_w = self.ui_rect.right - tab_x if key == tabs[-1][0] else text_w + spare
+            self.tab_buttons[key] = Adv_TabButton(tab_x, 40, tab_w, 30, label, self.font_medium)
+            tab_x += tab_w
         
         y_pos_start = 90
         
@@ -106,28 +193,32 @@ class AdvancedProjectileLab:
         
         y_pos = y_pos_start
         
+        # Tighter rows than the other tabs, so the drag and terrain controls
+        # fit inside the panel.
         self.sliders['gravity'] = Adv_Slider(x_pos, y_pos, w, 20, 0.1, 25.0, DEFAULT_GRAVITY_M, "Gravity (g)", "m/s²")
         self.textboxes['gravity'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, str(DEFAULT_GRAVITY_M), self.font_medium)
         self.widgets_by_tab['environment'].extend([self.sliders['gravity'], self.textboxes['gravity']])
-        y_pos += 50
+        y_pos += 45
 
         self.sliders['air_density'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 2.0, DEFAULT_AIR_DENSITY, "Air Density (ρ)", "kg/m³")
         self.textboxes['air_density'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, str(DEFAULT_AIR_DENSITY), self.font_medium)
         self.widgets_by_tab['environment'].extend([self.sliders['air_density'], self.textboxes['air_density']])
-        y_pos += 50
+        y_pos += 45
 
         self.sliders['drag_coeff'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 1.0, DEFAULT_DRAG_COEFF, "Drag Coeff (Cd)", "")
         self.textboxes['drag_coeff'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, str(DEFAULT_DRAG_COEFF), self.font_medium)
         self.widgets_by_tab['environment'].extend([self.sliders['drag_coeff'], self.textboxes['drag_coeff']])
-        y_pos += 50
+        y_pos += 45
         
         self.sliders['wind_vx'] = Adv_Slider(x_pos, y_pos, w, 20, -50.0, 50.0, DEFAULT_WIND_VX_M, "Wind Velocity (x)", "m/s")
         self.textboxes['wind_vx'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, str(DEFAULT_WIND_VX_M), self.font_medium)
         self.widgets_by_tab['environment'].extend([self.sliders['wind_vx'], self.textboxes['wind_vx']])
-        y_pos += 50
+        y_pos += 40
         
         self.checkboxes['air_drag'] = Adv_CheckBox(x_pos, y_pos, 20, 20, "Enable Air Drag", self.font_medium, True)
         self.widgets_by_tab['environment'].append(self.checkboxes['air_drag'])
+        self.buttons['terrain'] = Adv_Button(x_pos + 170, y_pos - 4, panel_w - 170, 28, f"Terrain: {self.terrain.name}", BLUE)
+        self.widgets_by_tab['environment'].append(self.buttons['terrain'])
         
         
         y_pos = y_pos_start
@@ -144,20 +235,91 @@ class AdvancedProjectileLab:
         
         self.checkboxes['ideal_path'] = Adv_CheckBox(x_pos, y_pos, 20, 20, "Show Ideal Path", self.font_medium, True)
         self.widgets_by_tab['view'].append(self.checkboxes['ideal_path'])
+        self.checkboxes['adaptive'] = Adv_CheckBox(x_pos + 170, y_pos, 20, 20, "Adaptive RK45", self.font_medium, False)
+        self.widgets_by_tab['view'].append(self.checkboxes['adaptive'])
+        y_pos += 35
+        
+        self.sliders['tolerance'] = Adv_Slider(x_pos, y_pos, w, 20, -10.0, -3.0, -6.0, "RK45 Tolerance (log10)", "")
+        self.textboxes['tolerance'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, "-6.0", self.font_medium)
+        self.widgets_by_tab['view'].extend([self.sliders['tolerance'], self.textboxes['tolerance']])
+        y_pos += 40
+        self.cache_text_y = y_pos
+        
+        
+        y_pos = y_pos_start
+        
+        self.checkboxes['sweep_velocity'] = Adv_CheckBox(x_pos, y_pos, 20, 20, "Sweep Velocity (instead of Angle)", self.font_medium, False)
+        self.widgets_by_tab['analysis'].append(self.checkboxes['sweep_velocity'])
+        y_pos += 35
+        
+        half_w = (panel_w - 10) // 2
+        self.buttons['sweep_metric'] = Adv_Button(x_pos, y_pos, half_w, 30, "Plot: Range", BLUE)
+        self.buttons['apply_best'] = Adv_Button(x_pos + half_w + 10, y_pos, half_w, 30, "Use Best Value", GREEN)
+        self.widgets_by_tab['analysis'].extend([self.buttons['sweep_metric'], self.buttons['apply_best']])
+        y_pos += 40
+        self.sweep_text_y = y_pos
+        y_pos += 45
+        
+        self.buttons['aim_low'] = Adv_Button(x_pos, y_pos, half_w, 30, "Aim at Target: Low Arc", TARGET_COLOR)
+        self.buttons['aim_high'] = Adv_Button(x_pos + half_w + 10, y_pos, half_w, 30, "Aim at Target: High Arc", TARGET_COLOR)
+        self.widgets_by_tab['analysis'].extend([self.buttons['aim_low'], self.buttons['aim_high']])
+        y_pos += 40
+        self.solver_text_y = y_pos
+        
+        
+        y_pos = y_pos_start
+        
+        self.sliders['spread_v0'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 20.0, 2.0, "Velocity Spread (σ)", "m/s")
+        self.textboxes['spread_v0'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, "2.0", self.font_medium)
+        self.widgets_by_tab['dispersion'].extend([self.sliders['spread_v0'], self.textboxes['spread_v0']])
+        y_pos += 50
+        
+        self.sliders['spread_cd'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 0.2, 0.03, "Drag Coeff Spread (σ)", "")
+        self.textboxes['spread_cd'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, "0.03", self.font_medium)
+        self.widgets_by_tab['dispersion'].extend([self.sliders['spread_cd'], self.textboxes['spread_cd']])
+        y_pos += 50
+        
+        self.sliders['spread_wind'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 10.0, 2.0, "Wind Spread (σ)", "m/s")
+        self.textboxes['spread_wind'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, "2.0", self.font_medium)
+        self.widgets_by_tab['dispersion'].extend([self.sliders['spread_wind'], self.textboxes['spread_wind']])
+        y_pos += 50
+        
+        self.sliders['spread_mass'] = Adv_Slider(x_pos, y_pos, w, 20, 0.0, 20.0, 2.0, "Mass Spread (σ)", "%")
+        self.textboxes['spread_mass'] = Adv_TextBox(x_pos + w + 10, y_pos, 70, 30, "2.0", self.font_medium)
+        self.widgets_by_tab['dispersion'].extend([self.sliders['spread_mass'], self.textboxes['spread_mass']])
+        
+        # The four spreads fill the tab panel, so the run controls sit just
+        # below it and the summary and histogram move down to make room.
+        y_pos = 300
+        self.buttons['dispersion_samples'] = Adv_Button(x_pos, y_pos, half_w, 30, "Samples: 100k", BLUE)
+        self.buttons['run_dispersion'] = Adv_Button(x_pos + half_w + 10, y_pos, half_w, 30, "Run Dispersion", GREEN)
+        self.widgets_by_tab['dispersion'].extend([self.buttons['dispersion_samples'], self.buttons['run_dispersion']])
         
         
         graph_y = 300
-        self.altitude_graph = Adv_Graph(
-            pygame.Rect(panel_x, graph_y, panel_w, 200),
-            "Time (s)", "Altitude (m)", self.font_small, 200
+        self.flight_graph = Adv_Graph(
+            pygame.Rect(panel_x, graph_y, panel_w, 160),
+            "Time (s)  -  click for the next channel", "Altitude (m)", self.font_small, 200
+        )
+        self.sweep_graph = Adv_Graph(
+            pygame.Rect(panel_x, graph_y, panel_w, 160),
+            "Launch Angle (deg)", "Range (m)", self.font_small, SWEEP_POINTS
+        )
+        self.dispersion_text_y = graph_y + 40
+        self.dispersion_graph = Adv_Graph(
+            pygame.Rect(panel_x, graph_y + 80, panel_w, 95),
+            "Impact Distance (m)", "Launches", self.font_small, 1000
         )
         
         
-        button_y = 520
+        button_y = 480
         self.buttons['launch'] = Adv_Button(panel_x, button_y, (panel_w - 10) // 2, 50, "LAUNCH", GREEN)
         self.buttons['reset'] = Adv_Button(panel_x + (panel_w + 10) // 2, button_y, (panel_w - 10) // 2, 50, "RESET", RED)
         button_y += 60
-        self.buttons['clear_trails'] = Adv_Button(panel_x, button_y, panel_w, 40, "Clear All Trails", BLUE)
+        third_w = (panel_w - 20) // 3
+        self.buttons['clear_trails'] = Adv_Button(panel_x, button_y, third_w, 40, "Clear Trails", BLUE)
+        self.buttons['salvo'] = Adv_Button(panel_x + third_w + 10, button_y, third_w, 40, f"Salvo ({SALVO_SIZE})", TARGET_COLOR)
+        self.buttons['export'] = Adv_Button(panel_x + 2 * (third_w + 10), button_y, third_w, 40, "Export Flight", DARK_GRAY)
         
        
         self.data_readout_y = button_y + 60
@@ -215,10 +377,31 @@ class AdvancedProjectileLab:
                         elif self.buttons['reset'].is_over(mouse_pos):
                             self.reset_simulation()
                         elif self.buttons['clear_trails'].is_over(mouse_pos):
-                            self.trajectories = []
-                            self.ideal_trajectories = []
+                            self.trajectories.clear()
+                            self.ideal_trajectories.clear()
+                            self.clear_dispersion()
+                        elif self.buttons['salvo'].is_over(mouse_pos):
+                            self.fire_salvo()
+                        elif self.buttons['export'].is_over(mouse_pos):
+                            self.export_flight()
+                        elif self.active_tab not in ('analysis', 'dispersion') and self.flight_graph.rect.collidepoint(mouse_pos):
+                            self.cycle_graph_channel()
                         elif self.buttons['back'].is_over(mouse_pos):
                             return 'main_menu'
+                        elif self.active_tab == 'analysis' and self.buttons['sweep_metric'].is_over(mouse_pos):
+                            self.cycle_sweep_metric()
+                        elif self.active_tab == 'analysis' and self.buttons['apply_best'].is_over(mouse_pos):
+                            self.apply_sweep_best()
+                        elif self.active_tab == 'analysis' and self.buttons['aim_low'].is_over(mouse_pos):
+                            self.solve_for_target('low')
+                        elif self.active_tab == 'analysis' and self.buttons['aim_high'].is_over(mouse_pos):
+                            self.solve_for_target('high')
+                        elif self.active_tab == 'environment' and self.buttons['terrain'].is_over(mouse_pos):
+                            self.cycle_terrain()
+                        elif self.active_tab == 'dispersion' and self.buttons['dispersion_samples'].is_over(mouse_pos):
+                            self.cycle_dispersion_samples()
+                        elif self.active_tab == 'dispersion' and self.buttons['run_dispersion'].is_over(mouse_pos):
+                            self.start_dispersion()
                         
                         for cb in self.checkboxes.values():
                             if cb in self.widgets_by_tab[self.active_tab] and cb.is_over(mouse_pos):
@@ -252,60 +435,322 @@ class AdvancedProjectileLab:
                         self.sync_widgets('slider', key)
         return None 
 
+    def launch_parameters(self):
+        # Physical launch settings from the sliders, with drag switched off
+        # when the Air Drag box is unchecked.
+        params = {
+            'v0': self.sliders['velocity'].get_value(),
+            'angle': self.sliders['angle'].get_value(),
+            'mass': self.sliders['mass'].get_value(),
+            'area': math.pi * self.sliders['radius'].get_value() ** 2,
+            'g': self.sliders['gravity'].get_value(),
+            'rho': self.sliders['air_density'].get_value(),
+            'Cd': self.sliders['drag_coeff'].get_value(),
+            'wind_vx': self.sliders['wind_vx'].get_value(),
+        }
+        if not self.checkboxes['air_drag'].checked:
+            params['rho'], params['Cd'], params['wind_vx'] = 0, 0, 0
+        return params
+
+    def launch_key(self, params):
+        dt = self.sim_clock.dt * self.sliders['time_scale'].get_value()
+        integrator = 'rk45' if self.checkboxes['adaptive'].checked else 'rk4'
+        return trajectory_key(params, dt, integrator, 10 ** self.sliders['tolerance'].get_value()) + (self.terrain.key,)
+
     def launch_projectile(self):
         self.simulation_running = True
         self.buttons['launch'].disabled = True
         self.buttons['launch'].text = "RUNNING..."
         self.hit_target = False
         
-        self.altitude_graph.clear_data()
+        self.flight_graph.clear_data()
         self.last_projectile = None
         self.last_ideal_projectile = None
         
-        v0 = self.sliders['velocity'].get_value()
-        angle_deg = self.sliders['angle'].get_value()
-        angle_rad = math.radians(angle_deg)
-        mass = self.sliders['mass'].get_value()
-        radius = self.sliders['radius'].get_value()
-        g = self.sliders['gravity'].get_value()
-        rho = self.sliders['air_density'].get_value()
-        Cd = self.sliders['drag_coeff'].get_value()
-        wind_vx = self.sliders['wind_vx'].get_value()
-        
-        use_air_drag = self.checkboxes['air_drag'].checked
-        show_ideal = self.checkboxes['ideal_path'].checked
-        
-        vx_initial = v0 * math.cos(angle_rad)
-        vy_initial = v0 * math.sin(angle_rad)
+        params = self.launch_parameters()
+        angle_rad = math.radians(params['angle'])
+        g = params['g']
         
-        area = math.pi * radius**2
+        show_ideal = self.checkboxes['ideal_path'].checked
+        integrator = 'rk45' if self.checkboxes['adaptive'].checked else 'rk4'
+        tolerance = 10 ** self.sliders['tolerance'].get_value()
+        self.flight_key = self.launch_key(params)
         
-        if not use_air_drag:
-            rho, Cd, wind_vx = 0, 0, 0
+        vx_initial = params['v0'] * math.cos(angle_rad)
+        vy_initial = params['v0'] * math.sin(angle_rad)
             
-        start_pos = (0, 0.1)
-        self.last_projectile = Adv_Projectile(start_pos[0], start_pos[1], vx_initial, vy_initial, mass, area, g, rho, Cd, wind_vx)
-        self.trajectories.append([])
+        start_pos = LAUNCH_POS_M
+        flight = self.trajectory_cache.get(self.flight_key)
+        if flight is not None:
+            self.last_projectile = Adv_ProjectileReplay(flight)
+            self.flight_samples = None
+        else:
+            self.last_projectile = Adv_Projectile(start_pos[0], start_pos[1], vx_initial, vy_initial, params['mass'], params['area'], g,
+                                                  params['rho'], params['Cd'], params['wind_vx'],
+                                                  integrator=integrator, rtol=tolerance, atol=tolerance, terrain=self.terrain)
+            self.flight_samples = [(0.0,) + tuple(self.last_projectile.state)]
+        self.trajectories.start()
+        self.telemetry = FlightTelemetry(params)
+        self.telemetry.record(0.0, self.last_projectile.state)
+        self.export_message = None
         
         if show_ideal:
             self.last_ideal_projectile = Adv_IdealProjectile(start_pos[0], start_pos[1], vx_initial, vy_initial, g)
-            self.ideal_trajectories.append([])
+            self.ideal_trajectories.start()
+            self.ideal_revealed = 0
+
+    def fire_salvo(self):
+        # SALVO_SIZE shells around the current settings, varied by the spreads
+        # on the Dispersion tab, joined to the shells already in the air.
+        params = self.launch_parameters()
+        v0, launch = ballistics.perturbed_launches(params, self.dispersion_spread(), SALVO_SIZE, self.salvo_rng)
+        shells, _ = ballistics.flight_batch(v0, params['angle'], launch, terrain=self.terrain)
+        if self.salvo is None:
+            self.salvo = shells
+        else:
+            self.salvo.extend(shells)
+        self.salvo_prev = self.salvo.state.copy()
+
+    def update_salvo(self, dt):
+        start = time.perf_counter()
+        if np.count_nonzero(self.salvo.is_active) < len(self.salvo) // 2:
+            self.salvo.compact()
+        self.salvo_prev = self.salvo.state.copy()
+        self.salvo.update_rk4(dt)
+        if not self.salvo.is_active.any():
+            self.salvo = None
+        self.salvo_ms = 1000.0 * (time.perf_counter() - start)
+
+    def cycle_graph_channel(self):
+        channels = CHANNELS[1:]
+        self.graph_channel = channels[(channels.index(self.graph_channel) + 1) % len(channels)]
+        self.flight_graph.y_label = CHANNEL_LABELS[self.graph_channel]
+        self.update_flight_graph()
+
+    def update_flight_graph(self):
+        # The graph reads the telemetry columns directly; nothing is copied.
+        if self.telemetry is not None:
+            self.flight_graph.set_series(self.telemetry.channel('time'), self.telemetry.channel(self.graph_channel))
+
+    def export_flight(self):
+        # Writes the current flight's telemetry to EXPORT_DIR as .npz and .csv.
+        if self.telemetry is None or len(self.telemetry) < 2:
+            self.export_message = "Nothing to export yet: launch a projectile first."
+            return
+        os.makedirs(EXPORT_DIR, exist_ok=True)
+        path = os.path.join(EXPORT_DIR, time.strftime("flight_%Y%m%d_%H%M%S"))
+        try:
+            self.telemetry.save_npz(path + ".npz")
+            self.telemetry.save_csv(path + ".csv")
+        except OSError as error:
+            self.export_message = f"Export failed: {error}"
+            return
+        self.export_message = f"Exported {len(self.telemetry)} steps to {path}.npz/.csv"
 
     def reset_simulation(self):
+        self.salvo = None
+        self.telemetry = None
         self.simulation_running = False
         self.last_projectile = None
         self.last_ideal_projectile = None
+        self.flight_samples = None
         self.buttons['launch'].disabled = False
         self.buttons['launch'].text = "LAUNCH"
         self.target_pos_m = None
         self.hit_target = False
-        self.altitude_graph.clear_data()
+        self.flight_graph.clear_data()
+
+    def cycle_sweep_metric(self):
+        metrics = ['range', 'max_height', 'flight_time']
+        self.sweep_metric = metrics[(metrics.index(self.sweep_metric) + 1) % len(metrics)]
+
+    def update_sweep(self):
+        # Re-run the sweep only when a physical parameter changed, and not
+        # while a slider is still being dragged. The work happens on
+        # sweep_worker; the graph switches over when its result comes back.
+        if any(slider.dragging for slider in self.sliders.values()):
+            return
+        params = self.launch_parameters()
+        axis = 'velocity' if self.checkboxes['sweep_velocity'].checked else 'angle'
+        key = (axis, self.sweep_metric, self.terrain.key) + tuple(quantize(value) for value in params.values())
+        if key != self.sweep_requested:
+            self.sweep_requested = key
+            cached = self.trajectory_cache.get(('sweep',) + key)
+            if cached is not None:
+                self.sweep_ms = None
+                self.show_sweep(key, *cached)
+                return
+            slider = self.sliders[axis]
+            values = np.linspace(slider.min_val, slider.max_val, SWEEP_POINTS)
+            self.sweep_started = time.perf_counter()
+            self.sweep_worker.submit(key, axis, values, params, self.sweep_metric, self.terrain)
 
-    def update_simulation(self):
+        finished = self.sweep_worker.latest()
+        if finished is None or finished[0] != key or key == self.sweep_key:
+            return
+        values, result, best = finished[1]
+        self.sweep_ms = 1000.0 * (time.perf_counter() - self.sweep_started)
+        self.trajectory_cache.put(('sweep',) + key, finished[1], sum(array.nbytes for array in result.values()))
+        self.show_sweep(key, values, result, best)
+
+    def show_sweep(self, key, values, result, best):
+        self.sweep_key = key
+        self.sweep_result = result
+        self.sweep_best = best
+        labels = {'range': "Range (m)", 'max_height': "Max Height (m)", 'flight_time': "Flight Time (s)"}
+        self.sweep_graph.x_label = "Launch Angle (deg)" if key[0] == 'angle' else "Velocity (m/s)"
+        self.sweep_graph.y_label = labels[key[1]]
+        self.sweep_graph.set_data(values, result[key[1]], marker=best)
+        self.buttons['sweep_metric'].text = f"Plot: {labels[key[1]].split(' (')[0]}"
+
+    def apply_sweep_best(self):
+        if self.sweep_best is None:
+            return
+        key = 'velocity' if self.sweep_key[0] == 'velocity' else 'angle'
+        self.sliders[key].set_value(self.sweep_best[0])
+        self.sync_widgets('slider', key)
+
+    def solve_for_target(self, arc):
+        # Points the cannon at the placed target: the low or high arc angle at
+        # the current speed, or, out of reach, the slowest speed at this angle.
+        if self.target_pos_m is None:
+            self.solver_lines = ["Click the simulation area to place a target."]
+            return
+        params = self.launch_parameters()
+        start = time.perf_counter()
+        angles = ballistics.solve_angle(self.target_pos_m, params['v0'], params, terrain=self.terrain)
+        if angles:
+            angle = angles[0] if arc == 'low' else angles[-1]
+            self.sliders['angle'].set_value(angle)
+            self.sync_widgets('slider', 'angle')
+            found = ", ".join(f"{a:.2f} deg" for a in angles)
+            self.solver_lines = [f"Solutions at {params['v0']:.1f} m/s: {found}"]
+        else:
+            v = ballistics.solve_velocity(self.target_pos_m, params['angle'], params,
+                                          self.sliders['velocity'].min_val, self.sliders['velocity'].max_val,
+                                          terrain=self.terrain)
+            if v is None:
+                self.solver_lines = ["Target out of reach at any speed on this angle."]
+            else:
+                self.sliders['velocity'].set_value(v)
+                self.sync_widgets('slider', 'velocity')
+                self.solver_lines = [f"Out of reach; needs {v:.2f} m/s at {params['angle']:.1f} deg"]
+        self.solver_lines.append(f"Solved in {1000.0 * (time.perf_counter() - start):.0f} ms")
+
+    def cycle_terrain(self):
+        self.terrain = self.terrains[(self.terrains.index(self.terrain) + 1) % len(self.terrains)]
+        self.buttons['terrain'].text = f"Terrain: {self.terrain.name}"
+
+    def cycle_dispersion_samples(self):
+        counts = self.dispersion_counts
+        self.dispersion_total = counts[(counts.index(self.dispersion_total) + 1) % len(counts)]
+        self.buttons['dispersion_samples'].text = f"Samples: {self.dispersion_total // 1000}k"
+
+    def dispersion_spread(self):
+        spread = {
+            'v0': self.sliders['spread_v0'].get_value(),
+            'Cd': self.sliders['spread_cd'].get_value(),
+            'wind_vx': self.sliders['spread_wind'].get_value(),
+            'mass': self.sliders['spread_mass'].get_value() / 100.0,
+        }
+        if not self.checkboxes['air_drag'].checked:
+            spread['Cd'], spread['wind_vx'] = 0.0, 0.0
+        return spread
+
+    def start_dispersion(self):
+        self.clear_dispersion()
+        self.dispersion_run = ballistics.dispersion_steps(self.launch_parameters(), self.dispersion_spread(), self.dispersion_total,
+                                                          terrain=self.terrain)
+        self.buttons['run_dispersion'].text = "Restart"
+
+    def clear_dispersion(self):
+        self.dispersion_run = None
+        self.dispersion_chunks = []
+        self.dispersion_impacts = None
+        self.dispersion_percentiles = None
+        self.dispersion_ms = 0.0
+        self.dispersion_bars_key = None
+        self.dispersion_graph.clear_data()
+        self.buttons['run_dispersion'].text = "Run Dispersion"
+
+    def update_dispersion(self):
+        # Advances the running batch until this frame's budget is spent. A
+        # landed chunk ends the frame, and its statistics are redone on the
+        # next one instead of stepping, so the two never share a frame.
+        start = time.perf_counter()
+        if self.dispersion_impacts is None or len(self.dispersion_impacts) < sum(map(len, self.dispersion_chunks)):
+            self.update_dispersion_stats()
+        else:
+            while time.perf_counter() - start < DISPERSION_FRAME_BUDGET:
+                landed = next(self.dispersion_run, False)
+                if landed is False:
+                    self.dispersion_run = None
+                    self.buttons['run_dispersion'].text = "Run Dispersion"
+                    break
+                if landed is not None:
+                    self.dispersion_chunks.append(landed)
+                    break
+        self.dispersion_ms += 1000.0 * (time.perf_counter() - start)
+
+    def update_dispersion_stats(self):
+        impacts = np.concatenate(self.dispersion_chunks) if self.dispersion_chunks else np.empty(0)
+        self.dispersion_impacts = impacts
+        if len(impacts) == 0:
+            return
+        quantiles = np.percentile(impacts, [0.5, 5, 25, 50, 75, 95, 99.5])
+        self.dispersion_percentiles = dict(zip((5, 25, 50, 75, 95), quantiles[1:-1]))
+        lo, hi = quantiles[0], quantiles[-1]
+        width = max(hi - lo, 1e-9) / 60
+        bins = np.floor((impacts - lo) / width).astype(np.int64)
+        counts = np.bincount(bins[(bins >= 0) & (bins < 60)], minlength=60)
+        centers = lo + width * (np.arange(60) + 0.5)
+        median = self.dispersion_percentiles[50]
+        self.dispersion_graph.set_data(centers, counts, marker=(median, counts[min(int((median - lo) // width), 59)]))
+
+    def update_preview(self):
+        # Ghost path for the current settings: a recorded flight if the cache
+        # has one, otherwise the newest path finished by the worker thread.
+        params = self.launch_parameters()
+        key = self.launch_key(params)
+        if key != self.preview_key:
+            self.preview_key = key
+            if self.trajectory_cache.peek(key) is None:
+                self.preview_worker.submit(key, params, self.terrain)
+        source = self.trajectory_cache.peek(key) or self.preview_worker.latest()
+        if source is not None and source is not self.preview_source:
+            self.preview_source = source
+            self.preview_path = source.samples[:, 1:3] if isinstance(source, Flight) else source[1]
+            self.preview_runs_key = None
+
+    def record_flight_sample(self):
+        proj = self.last_projectile
+        self.flight_samples.append((proj.time,) + tuple(proj.state))
+        if not proj.is_active:
+            flight = Flight(self.flight_samples, proj.max_height, proj.evaluations, proj.integrator)
+            self.trajectory_cache.put(self.flight_key, flight, flight.nbytes)
+            self.flight_samples = None
+
+    def reveal_ideal_path(self):
+        # The ideal path is computed whole at launch; the trail just shows
+        # the part the ideal projectile has reached so far.
+        ideal = self.last_ideal_projectile
+        if self.ideal_trajectories:
+            trail = self.ideal_trajectories[-1]
+            trail.extend(ideal.path[self.ideal_revealed:ideal.index])
+        self.ideal_revealed = ideal.index
+
+    def update_simulation(self, dt=DT):
         self.PIXELS_PER_METER = self.sliders['zoom'].get_value()
-        zoom = self.PIXELS_PER_METER
         time_scale = self.sliders['time_scale'].get_value()
-        effective_dt = DT * time_scale
+        effective_dt = dt * time_scale
+        
+        if self.active_tab == 'analysis':
+            self.update_sweep()
+        if self.dispersion_run is not None:
+            self.update_dispersion()
+        self.update_preview()
+        if self.salvo is not None:
+            self.update_salvo(effective_dt)
         
         if not self.simulation_running:
             return
@@ -314,13 +759,15 @@ class AdvancedProjectileLab:
         
         if self.last_projectile and self.last_projectile.is_active:
             active_projectiles_exist = True
-            self.last_projectile.update_rk4(effective_dt)
+            self.last_projectile.update(effective_dt)
             
-            screen_pos = adv_to_screen_coords((self.last_projectile.x, self.last_projectile.y), zoom, self.CANNON_ORIGIN_PIX)
             if self.trajectories:
-                self.trajectories[-1].append(screen_pos)
+                self.trajectories[-1].append(self.last_projectile.x, self.last_projectile.y)
             
-            self.altitude_graph.add_data_point(self.last_projectile.time, self.last_projectile.y)
+            self.telemetry.record(self.last_projectile.time, self.last_projectile.state)
+            self.update_flight_graph()
+            if self.flight_samples is not None:
+                self.record_flight_sample()
             
             if self.target_pos_m and not self.hit_target:
                 dist = math.sqrt((self.last_projectile.x - self.target_pos_m[0])**2 + (self.last_projectile.y - self.target_pos_m[1])**2)
@@ -328,38 +775,33 @@ class AdvancedProjectileLab:
                     self.hit_target = True
 
         if self.last_ideal_projectile and self.last_ideal_projectile.is_active:
-            self.last_ideal_projectile.update(effective_dt)
-            screen_pos = adv_to_screen_coords((self.last_ideal_projectile.x, self.last_ideal_projectile.y), zoom, self.CANNON_ORIGIN_PIX)
-            if self.ideal_trajectories:
-                self.ideal_trajectories[-1].append(screen_pos)
+            if not active_projectiles_exist:
+                self.last_ideal_projectile.finish()
+            else:
+                self.last_ideal_projectile.update(effective_dt)
+            self.reveal_ideal_path()
         
         if not active_projectiles_exist and self.simulation_running:
             self.simulation_running = False
             self.buttons['launch'].disabled = False
             self.buttons['launch'].text = "LAUNCH"
 
-    def draw_all(self):
-        self.draw_simulation_area()
+    def draw_all(self, alpha=1.0):
+        self.draw_simulation_area(alpha)
         self.draw_gui_panel()
 
-    def draw_simulation_area(self):
+    def draw_simulation_area(self, alpha=1.0):
         
         self.screen.set_clip(self.sim_rect)
         
-        
-        for y in range(self.sim_rect.top, self.sim_rect.bottom):
-            lerp = y / self.sim_rect.height
-            color = (
-                SKY_BLUE_TOP[0] * (1 - lerp) + SKY_BLUE_BOTTOM[0] * lerp,
-                SKY_BLUE_TOP[1] * (1 - lerp) + SKY_BLUE_BOTTOM[1] * lerp,
-                SKY_BLUE_TOP[2] * (1 - lerp) + SKY_BLUE_BOTTOM[2] * lerp,
-            )
-            pygame.draw.line(self.screen, color, (self.sim_rect.left, y), (self.sim_rect.right, y))
-            
-        pygame.draw.rect(self.screen, GRASS_GREEN, (self.sim_rect.left, self.GROUND_Y, self.sim_rect.width, self.sim_rect.height - self.GROUND_Y))
-        pygame.draw.line(self.screen, BLACK, (self.sim_rect.left, self.GROUND_Y), (self.sim_rect.right, self.GROUND_Y), 3)
-        
+        engine = "RK45" if self.checkboxes['adaptive'].checked else "RK4"
         zoom = self.sliders['zoom'].get_value()
+        background_key = (self.sim_rect.size, self.GROUND_Y, engine, zoom, self.terrain.key)
+        if background_key != self.background_key:
+            self.background_key = background_key
+            self.background = self.render_background(engine, zoom)
+        self.screen.blit(self.background, self.sim_rect.topleft)
+        
         if self.target_pos_m:
             target_pix_pos = adv_to_screen_coords(self.target_pos_m, zoom, self.CANNON_ORIGIN_PIX)
             target_pix_rad = int(self.target_radius_m * zoom)
@@ -368,28 +810,19 @@ class AdvancedProjectileLab:
                 pygame.draw.circle(self.screen, WHITE, target_pix_pos, int(target_pix_rad * 0.6), max(1, int(target_pix_rad * 0.1)))
                 pygame.draw.circle(self.screen, TARGET_COLOR, target_pix_pos, int(target_pix_rad * 0.3))
         
-        for trajectory in self.ideal_trajectories:
-            if len(trajectory) > 2:
-                for i in range(0, len(trajectory) - 1, 10):
-                    start = trajectory[i]
-                    end_index = min(i + 5, len(trajectory) - 1)
-                    end = trajectory[end_index]
-                    if self.sim_rect.collidepoint(start) and self.sim_rect.collidepoint(end):
-                        pygame.draw.line(self.screen, DARK_GRAY, start, end, 2)
-                        
-        for trajectory in self.trajectories:
-            if len(trajectory) > 1:
-                valid_points = [p for p in trajectory if self.sim_rect.collidepoint(p)]
-                if len(valid_points) > 1:
-                    pygame.draw.lines(self.screen, RED, False, valid_points, 3)
+        if self.dispersion_impacts is not None:
+            self.draw_dispersion(zoom)
+        self.draw_trails(zoom)
                         
         if self.last_projectile:
-            self.last_projectile.draw(self.screen, zoom, self.CANNON_ORIGIN_PIX, self.sim_rect)
+            self.last_projectile.draw(self.screen, zoom, self.CANNON_ORIGIN_PIX, self.sim_rect, alpha)
+        if self.salvo is not None:
+            self.draw_salvo(zoom, alpha)
             
         self.draw_cannon()
-        
-        title_text = self.font_large.render("Simulation Area (RK4 Engine)", True, DARK_GRAY)
-        self.screen.blit(title_text, (self.sim_rect.centerx - title_text.get_width() // 2, 10))
+        if self.export_message:
+            text_surf = self.font_small.render(self.export_message, True, DARK_GRAY)
+            self.screen.blit(text_surf, (self.sim_rect.x + 10, self.sim_rect.y + 58))
         
         
         self.screen.set_clip(None)
@@ -398,6 +831,121 @@ class AdvancedProjectileLab:
         pygame.draw.rect(self.screen, DARK_GRAY, self.sim_rect, 5)
 
 
+    def draw_salvo(self, zoom, alpha):
+        salvo = self.salvo
+        rows = np.flatnonzero(salvo.is_active)
+        if len(rows) == 0:
+            return
+        prev = self.salvo_prev[rows, :2] if len(self.salvo_prev) == len(salvo) else salvo.state[rows, :2]
+        pixels = project(prev + alpha * (salvo.state[rows, :2] - prev), zoom, self.CANNON_ORIGIN_PIX)
+        rect = self.sim_rect
+        inside = ((pixels[:, 0] >= rect.left) & (pixels[:, 0] < rect.right) &
+                  (pixels[:, 1] >= rect.top) & (pixels[:, 1] < rect.bottom))
+        count = np.count_nonzero(inside)
+        self.salvo_renderer.draw(self.screen, pixels[inside], np.full(count, SALVO_SHELL_PX), np.zeros((count, 3)))
+        salvo_text = f"Salvo: {len(rows)} shells in flight, {self.salvo_ms:.2f} ms/step"
+        self.screen.blit(self.font_small.render(salvo_text, True, DARK_GRAY), (rect.x + 10, rect.y + 40))
+
+    def render_background(self, engine, zoom):
+        # Sky, terrain and title only change with the zoom or the terrain, so
+        # they are drawn once into a display-format surface and blitted every
+        # frame.
+        width, height = self.sim_rect.size
+        lerp = np.arange(self.sim_rect.top, self.sim_rect.bottom) / height
+        sky = np.outer(1 - lerp, SKY_BLUE_TOP) + np.outer(lerp, SKY_BLUE_BOTTOM)
+        column = pygame.surfarray.make_surface(sky.astype(np.uint8)[None, :, :])
+        background = pygame.transform.scale(column, (width, height)).convert()
+        
+        # One terrain sample per pixel column.
+        columns = np.arange(width + 1)
+        x_m = (self.sim_rect.left + columns - self.CANNON_ORIGIN_PIX[0]) / zoom
+        ground_y = self.GROUND_Y - self.sim_rect.top - (self.terrain.height(x_m) * zoom).astype(np.int64)
+        outline = np.column_stack((columns, ground_y)).tolist()
+        pygame.draw.polygon(background, GRASS_GREEN, outline + [(width, height), (0, height)])
+        pygame.draw.lines(background, BLACK, False, outline, 3)
+        
+        title_text = self.font_large.render(f"Simulation Area ({engine} Engine)", True, DARK_GRAY)
+        background.blit(title_text, (width // 2 - title_text.get_width() // 2, 10))
+        return background
+
+    def draw_dispersion(self, zoom):
+        # Impact density as bars standing on the ground, one bar per
+        # DISPERSION_BIN_PX screen pixels, rebinned only when new launches
+        # land or the zoom or terrain changes.
+        key = (zoom, len(self.dispersion_impacts), self.terrain.key)
+        if key != self.dispersion_bars_key:
+            self.dispersion_bars_key = key
+            pixels = self.CANNON_ORIGIN_PIX[0] + (self.dispersion_impacts * zoom).astype(np.int64)
+            bins = (pixels - self.sim_rect.left) // DISPERSION_BIN_PX
+            n_bins = self.sim_rect.width // DISPERSION_BIN_PX
+            counts = np.bincount(bins[(bins >= 0) & (bins < n_bins)], minlength=n_bins)
+            heights = np.ceil(counts * (DISPERSION_BAR_PX / max(counts.max(), 1))).astype(np.int64)
+            lefts = self.sim_rect.left + np.flatnonzero(heights) * DISPERSION_BIN_PX
+            centers_m = (lefts + DISPERSION_BIN_PX / 2 - self.CANNON_ORIGIN_PIX[0]) / zoom
+            bases = self.GROUND_Y - (self.terrain.height(centers_m) * zoom).astype(np.int64)
+            self.dispersion_bars = [(left, base - h, DISPERSION_BIN_PX - 1, h) for left, base, h in
+                                    zip(lefts.tolist(), bases.tolist(), heights[heights > 0].tolist())]
+        for bar in self.dispersion_bars:
+            pygame.draw.rect(self.screen, DISPERSION_COLOR, bar)
+        
+        if self.dispersion_percentiles is None:
+            return
+        p = {q: adv_to_screen_coords((x, 0), zoom, self.CANNON_ORIGIN_PIX)[0] for q, x in self.dispersion_percentiles.items()}
+        band_y = self.GROUND_Y + 10
+        pygame.draw.rect(self.screen, DISPERSION_BAND_OUTER, (p[5], band_y, max(p[95] - p[5], 1), 14))
+        pygame.draw.rect(self.screen, DISPERSION_BAND_INNER, (p[25], band_y + 3, max(p[75] - p[25], 1), 8))
+        pygame.draw.line(self.screen, BLACK, (p[50], band_y - 4), (p[50], band_y + 17), 2)
+
+    def draw_trails(self, zoom):
+        # Earlier launches are drawn once into trail_layer, which is reused
+        # until the zoom or the set of trails changes; only the newest trail
+        # and the preview are drawn every frame.
+        layer_origin = (self.CANNON_ORIGIN_PIX[0] - self.sim_rect.x, self.CANNON_ORIGIN_PIX[1] - self.sim_rect.y)
+        layer_rect = self.trail_layer.get_rect()
+        key = (zoom, tuple((id(t), t.version) for t in self.ideal_trajectories[:-1]),
+               tuple((id(t), t.version) for t in self.trajectories[:-1]))
+        if key != self.trail_layer_key:
+            self.trail_layer_key = key
+            self.trail_layer.fill(LAYER_COLOR_KEY)
+            for trajectory in self.ideal_trajectories[:-1]:
+                self.draw_ideal_trail(self.trail_layer, trajectory, zoom, layer_origin, layer_rect)
+            for trajectory in self.trajectories[:-1]:
+                self.draw_trail(self.trail_layer, trajectory, zoom, layer_origin, layer_rect)
+        self.screen.blit(self.trail_layer, self.sim_rect.topleft)
+        
+        origin = self.CANNON_ORIGIN_PIX
+        if self.ideal_trajectories:
+            self.draw_ideal_trail(self.screen, self.ideal_trajectories[-1], zoom, origin, self.sim_rect)
+        
+        if self.preview_path is not None and len(self.preview_path) > 1:
+            if self.preview_runs_key != zoom:
+                self.preview_runs_key = zoom
+                pixels = project(self.preview_path, zoom, origin)
+                self.preview_runs = clip_polyline(simplify(pixels), self.sim_rect)
+                self.preview_end = pixels[-1].tolist()
+            for run in self.preview_runs:
+                pygame.draw.lines(self.screen, PREVIEW_COLOR, False, run, 1)
+            pygame.draw.circle(self.screen, PREVIEW_COLOR, self.preview_end, 4, 1)
+        
+        if self.trajectories:
+            self.draw_trail(self.screen, self.trajectories[-1], zoom, origin, self.sim_rect)
+
+    def draw_trail(self, surface, trajectory, zoom, origin, rect):
+        for run in trajectory.runs(zoom, origin, rect):
+            pygame.draw.lines(surface, RED, False, run, 3)
+
+    def draw_ideal_trail(self, surface, trajectory, zoom, origin, rect):
+        if len(trajectory) < 3 or not trajectory.visible(zoom, origin, rect):
+            return
+        pixels = trajectory.project(zoom, origin)
+        inside = ((pixels[:, 0] >= rect.left) & (pixels[:, 0] < rect.right) &
+                  (pixels[:, 1] >= rect.top) & (pixels[:, 1] < rect.bottom))
+        starts = np.arange(0, len(pixels) - 1, 10)
+        ends = np.minimum(starts + 5, len(pixels) - 1)
+        keep = inside[starts] & inside[ends]
+        for start, end in zip(pixels[starts[keep]].tolist(), pixels[ends[keep]].tolist()):
+            pygame.draw.line(surface, DARK_GRAY, start, end, 2)
+
     def draw_cannon(self):
         angle_rad = math.radians(self.sliders['angle'].get_value())
         length = 30
@@ -423,19 +971,79 @@ class AdvancedProjectileLab:
         for widget in self.widgets_by_tab[self.active_tab]:
             widget.draw(self.screen, self.font_small)
             
-        self.altitude_graph.draw(self.screen)
+        if self.active_tab == 'analysis':
+            self.sweep_graph.draw(self.screen)
+            self.draw_sweep_summary(self.ui_rect.x + 20)
+            y_pos = self.solver_text_y
+            for line in self.solver_lines:
+                text_surf = self.font_small.render(line, True, BLACK)
+                self.screen.blit(text_surf, (self.ui_rect.x + 20, y_pos))
+                y_pos += 18
+        elif self.active_tab == 'dispersion':
+            self.dispersion_graph.draw(self.screen)
+            self.draw_dispersion_summary(self.ui_rect.x + 20)
+        else:
+            self.flight_graph.draw(self.screen)
+        if self.active_tab == 'view':
+            stats = self.trajectory_cache.stats()
+            cache_text = (f"Trajectory cache: {stats['entries']} entries, {stats['megabytes']:.2f} MB, "
+                          f"{stats['hits']} hits / {stats['misses']} misses / {stats['evictions']} evicted")
+            text_surf = self.font_small.render(cache_text, True, BLACK)
+            self.screen.blit(text_surf, (self.ui_rect.x + 20, self.cache_text_y))
             
+        tab_widgets = [widget for widgets in self.widgets_by_tab.values() for widget in widgets]
         for button in self.buttons.values():
-            button.draw(self.screen, self.font_medium)
+            if button not in tab_widgets:
+                button.draw(self.screen, self.font_medium)
             
         self.draw_data_readouts(self.ui_rect.x + 20)
 
+    def draw_sweep_summary(self, panel_x):
+        if self.sweep_best is None:
+            lines = ["Sweeping..."]
+        else:
+            axis, metric = self.sweep_key[:2]
+            best_x, best_score = self.sweep_best
+            unit = {'range': "m", 'max_height': "m", 'flight_time': "s"}[metric]
+            best_text = f"Best angle: {best_x:.2f} deg" if axis == 'angle' else f"Best velocity: {best_x:.2f} m/s"
+            if self.sweep_requested != self.sweep_key:
+                status = "updating..."
+            elif self.sweep_ms is None:
+                status = "(from cache)"
+            else:
+                status = f"in {self.sweep_ms:.0f} ms"
+            lines = [
+                f"{best_text}  ->  {best_score:.2f} {unit}",
+                f"{len(self.sweep_result['values'])} launches + golden-section refine {status}",
+            ]
+        y_pos = self.sweep_text_y
+        for line in lines:
+            text_surf = self.font_small.render(line, True, BLACK)
+            self.screen.blit(text_surf, (panel_x, y_pos))
+            y_pos += 18
+
+    def draw_dispersion_summary(self, panel_x):
+        if self.dispersion_impacts is None and self.dispersion_run is None:
+            lines = ["Set the spreads and press Run Dispersion."]
+        else:
+            landed = 0 if self.dispersion_impacts is None else len(self.dispersion_impacts)
+            state = "running" if self.dispersion_run is not None else "done"
+            lines = [f"{landed} / {self.dispersion_total} landed ({state}, {self.dispersion_ms:.0f} ms of compute)"]
+            if self.dispersion_percentiles is not None:
+                p = self.dispersion_percentiles
+                lines.append(f"Impact x  P5 {p[5]:.1f} m   P50 {p[50]:.1f} m   P95 {p[95]:.1f} m")
+        y_pos = self.dispersion_text_y
+        for line in lines:
+            text_surf = self.font_small.render(line, True, BLACK)
+            self.screen.blit(text_surf, (panel_x, y_pos))
+            y_pos += 18
+
     def draw_data_readouts(self, panel_x):
         y_pos = self.data_readout_y
         
         title = self.font_medium.render("--- Last Launch Data ---", True, BLACK)
         self.screen.blit(title, (panel_x, y_pos))
-        y_pos += 30
+        y_pos += 25
 
         if not self.last_projectile:
             no_data_text = self.font_small.render("Launch a projectile to see data.", True, DARK_GRAY)
@@ -443,11 +1051,16 @@ class AdvancedProjectileLab:
             return
 
         proj = self.last_projectile
+        engine = proj.integrator.upper()
+        if isinstance(proj, Adv_ProjectileReplay):
+            engine += ", replayed from cache"
+        ideal = self.last_ideal_projectile
         data = [
-            f"Time: {proj.time:.2f} s",
-            f"Max Height: {proj.max_height:.2f} m",
-            f"Range (Distance): {proj.x:.2f} m",
+            f"Time: {proj.time:.2f} s" + (f"  (ideal flight {ideal.flight_time:.2f} s)" if ideal else ""),
+            f"Max Height: {proj.max_height:.2f} m" + (f"  (ideal {ideal.max_height:.2f} m)" if ideal else ""),
+            f"Range (Distance): {proj.x:.2f} m" + (f"  (ideal {ideal.range:.2f} m)" if ideal else ""),
             f"Current Speed: {math.sqrt(proj.vx**2 + proj.vy**2):.2f} m/s",
+            f"Derivative Evals: {proj.evaluations} ({engine})",
         ]
         
         if self.target_pos_m:
@@ -457,4 +1070,4 @@ class AdvancedProjectileLab:
         for line in data:
             text_surf = self.font_small.render(line, True, BLACK)
             self.screen.blit(text_surf, (panel_x, y_pos))
-            y_pos += 20
\ No newline at end of file
+            y_pos += 18
\ No newline at end of file
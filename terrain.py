@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from constants import *
+
+
+class Terrain:
+    # Ground height in meters, sampled every `spacing` meters from x0.
+    # height(x) interpolates between the two samples around x, found by
+    # index arithmetic, so a lookup costs the same however hilly the ground
+    # is. Past either end the edge height carries on.
+    def __init__(self, heights, spacing=TERRAIN_SPACING, x0=0.0, name="Custom"):
+        self.heights = np.asarray(heights, dtype=np.float64).ravel()
+        if len(self.heights) < 2:
+            self.heights = np.resize(self.heights, 2)
+        self.spacing = float(spacing)
+        self.x0 = float(x0)
+        self.name = name
+        self.rises = np.append(np.diff(self.heights), 0.0)
+        # All-zero ground is just y = 0, which the engine tests in closed form.
+        self.flat = not self.heights.any()
+        self._last = len(self.heights) - 1
+        # Cache keys need a cheap identity that changes with the samples.
+        self.key = (name, self.spacing, self.x0, len(self.heights), hash(self.heights.tobytes()))
+
+    def height(self, x):
+        if isinstance(x, float):
+            # Single lookups (one per integrator step) skip the array path.
+            u = min(max((x - self.x0) / self.spacing, 0.0), self._last)
+            i = int(u)
+            return self.heights[i] + (u - i) * self.rises[i]
+        u = np.clip((np.asarray(x, dtype=np.float64) - self.x0) / self.spacing, 0.0, self._last)
+        i = u.astype(np.int64)
+        return self.heights[i] + (u - i) * self.rises[i]
+
+    @classmethod
+    def flat(cls):
+        return cls(np.zeros(2), name="Flat")
+
+    @classmethod
+    def hills(cls, amplitude=40.0, length=TERRAIN_LENGTH, spacing=TERRAIN_SPACING, seed=7, name="Hills"):
+        # A few sine waves with random phases, faded in between 50 and 150 m
+        # so the cannon always stands on level ground at x = 0.
+        rng = np.random.default_rng(seed)
+        x = np.arange(0.0, length + spacing, spacing)
+        heights = np.zeros_like(x)
+        for wavelength, weight in ((900.0, 1.0), (350.0, 0.5), (120.0, 0.2)):
+            heights += weight * np.sin(2 * np.pi * x / wavelength + rng.uniform(0, 2 * np.pi))
+        ramp = np.clip((x - 50.0) / 100.0, 0.0, 1.0)
+        heights *= amplitude / 1.7 * ramp * ramp * (3 - 2 * ramp)
+        return cls(heights, spacing, name=name)
+
+    @classmethod
+    def load(cls, path, spacing=TERRAIN_SPACING):
+        # A 1-D array of heights from .npy, or one number per line (or
+        # comma separated) from a text file.
+        if path.endswith('.npy'):
+            heights = np.load(path)
+        else:
+            heights = np.loadtxt(path, delimiter=',' if path.endswith('.csv') else None)
+        return cls(heights, spacing, name="File")
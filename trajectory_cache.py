@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+from collections import OrderedDict
+import numpy as np
+from constants import *
+
+
+def quantize(value, digits=TRAJECTORY_KEY_DIGITS):
+    # Rounds to significant figures, not decimal places, so small derived
+    # values such as the cross-section area keep their differences.
+    return float(f"{float(value):.{digits}g}")
+
+
+def trajectory_key(params, dt, integrator, tolerance):
+    # Slider values carry arbitrary trailing digits, so they are rounded before
+    # keying: moving a slider away and back lands on the same entry.
+    quantized = tuple(quantize(value) for value in params.values())
+    if integrator != 'rk45':
+        tolerance = None
+    else:
+        tolerance = round(float(np.log10(tolerance)), 2)
+    return ('flight',) + quantized + (round(float(dt), 9), integrator, tolerance)
+
+
+class Flight:
+    # A finished flight as samples of (t, x, y, vx, vy), one row per frame.
+    def __init__(self, samples, max_height, evaluations, integrator):
+        self.samples = np.asarray(samples, dtype=np.float64).reshape(-1, 5)
+        self.max_height = max_height
+        self.evaluations = evaluations
+        self.integrator = integrator
+
+    @property
+    def nbytes(self):
+        return self.samples.nbytes
+
+    @property
+    def duration(self):
+        return self.samples[-1, 0]
+
+
+class TrajectoryCache:
+    # Least-recently-used store for finished flights and other analysis
+    # results, bounded by the bytes of the arrays it holds rather than by
+    # entry count, since a long flight is far bigger than a short one.
+    def __init__(self, max_bytes=TRAJECTORY_CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def peek(self, key):
+        # Lookup that leaves the statistics and the eviction order alone.
+        entry = self.entries.get(key)
+        return None if entry is None else entry[0]
+
+    def put(self, key, value, nbytes):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        if nbytes > self.max_bytes:
+            return
+        self.entries[key] = (value, nbytes)
+        self.bytes += nbytes
+        while self.bytes > self.max_bytes:
+            _, (_, old_bytes) = self.entries.popitem(last=False)
+            self.bytes -= old_bytes
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'megabytes': self.bytes / (1024 * 1024),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+from constants import *
+
+
+def project(points, zoom, origin):
+    # World meters to screen pixels, same rounding as adv_to_screen_coords.
+    pixels = np.empty(points.shape, dtype=np.int64)
+    pixels[:, 0] = origin[0] + (points[:, 0] * zoom).astype(np.int64)
+    pixels[:, 1] = origin[1] - (points[:, 1] * zoom).astype(np.int64)
+    return pixels
+
+
+def simplify(pixels, tolerance=TRAIL_TOLERANCE_PX):
+    # Ramer-Douglas-Peucker on screen pixels, after dropping runs of points
+    # that landed on the same pixel.
+    if len(pixels) > 1:
+        moved = np.any(pixels[1:] != pixels[:-1], axis=1)
+        pixels = pixels[np.concatenate(([True], moved[:-1], [True]))]
+    n = len(pixels)
+    if n < 3:
+        return pixels
+    points = pixels.astype(np.float64)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        i, j = stack.pop()
+        if j - i < 2:
+            continue
+        offsets = points[i + 1:j] - points[i]
+        chord = points[j] - points[i]
+        length = np.hypot(chord[0], chord[1])
+        if length > 0:
+            dist = np.abs(offsets[:, 0] * chord[1] - offsets[:, 1] * chord[0]) / length
+        else:
+            dist = np.hypot(offsets[:, 0], offsets[:, 1])
+        k = int(np.argmax(dist))
+        if dist[k] > tolerance:
+            m = i + 1 + k
+            keep[m] = True
+            stack.append((i, m))
+            stack.append((m, j))
+    return pixels[keep]
+
+
+def clip_polyline(pixels, rect):
+    # Liang-Barsky clipping of every segment against rect at once. Returns
+    # the visible pieces as separate point lists, cut where the path leaves.
+    if len(pixels) < 2:
+        return []
+    start = pixels[:-1].astype(np.float64)
+    delta = pixels[1:] - start
+    t0 = np.zeros(len(start))
+    t1 = np.ones(len(start))
+    visible = np.ones(len(start), dtype=bool)
+    bounds = ((-delta[:, 0], start[:, 0] - rect.left), (delta[:, 0], rect.right - 1 - start[:, 0]),
+              (-delta[:, 1], start[:, 1] - rect.top), (delta[:, 1], rect.bottom - 1 - start[:, 1]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for p, q in bounds:
+            visible &= (p != 0) | (q >= 0)
+            r = q / p
+            t0 = np.where(p < 0, np.maximum(t0, r), t0)
+            t1 = np.where(p > 0, np.minimum(t1, r), t1)
+    visible &= t0 <= t1
+
+    segments = np.flatnonzero(visible)
+    if len(segments) == 0:
+        return []
+    a = start[segments] + t0[segments, None] * delta[segments]
+    b = start[segments] + t1[segments, None] * delta[segments]
+    joined = (np.diff(segments) == 1) & (t1[segments[:-1]] == 1.0) & (t0[segments[1:]] == 0.0)
+    breaks = np.flatnonzero(~joined) + 1
+    runs = []
+    for lo, hi in zip(np.concatenate(([0], breaks)), np.concatenate((breaks, [len(segments)]))):
+        runs.append(np.vstack((a[lo:lo + 1], b[lo:hi])).round().astype(np.int64).tolist())
+    return runs
+
+
+class Trail:
+    # One flight's path in meters, in a float array that doubles when full.
+    # At max_points every other point is dropped and from then on only every
+    # other appended point is kept, so a very long flight keeps an even
+    # spacing at bounded memory. The screen projection is kept and only
+    # extended for new points until the zoom or origin changes.
+    def __init__(self, capacity=256, max_points=TRAIL_MAX_POINTS):
+        self.points = np.empty((capacity, 2))
+        self.count = 0
+        self.max_points = max_points
+        self.stride = 1
+        self.appended = 0
+        self.version = 0
+        self.bounds = None
+        self._pixels = np.empty((capacity, 2), dtype=np.int64)
+        self._projected = 0
+        self._view = None
+        self._simplified = None
+        self._simplified_count = 0
+        self._runs = None
+        self._runs_key = None
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def data(self):
+        return self.points[:self.count]
+
+    def append(self, x, y):
+        self.appended += 1
+        if (self.appended - 1) % self.stride:
+            return
+        if self.count == self.max_points:
+            self._decimate()
+        elif self.count == len(self.points):
+            self._grow(self.count + 1)
+        self.points[self.count] = (x, y)
+        self.count += 1
+        self.version += 1
+        if self.bounds is None:
+            self.bounds = (x, y, x, y)
+        else:
+            x0, y0, x1, y1 = self.bounds
+            self.bounds = (min(x0, x), min(y0, y), max(x1, x), max(y1, y))
+
+    def extend(self, points):
+        # The same trail as calling append() for every point, done a slice
+        # at a time: the points the stride keeps are copied in whole until
+        # the next one would hit max_points and decimate.
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        while len(points):
+            first = (-self.appended) % self.stride
+            kept = points[first::self.stride]
+            take = min(len(kept), self.max_points - self.count)
+            self._store(kept[:take])
+            if take == len(kept):
+                self.appended += len(points)
+                return
+            # kept[take] arrives with the trail full: decimate, then store it.
+            consumed = first + take * self.stride
+            self.appended += consumed + 1
+            self._decimate()
+            self._store(points[consumed:consumed + 1])
+            points = points[consumed + 1:]
+
+    def _store(self, new):
+        if len(new) == 0:
+            return
+        end = self.count + len(new)
+        if end > len(self.points):
+            self._grow(end)
+        self.points[self.count:end] = new
+        self.count = end
+        self.version += len(new)
+        low, high = new.min(axis=0), new.max(axis=0)
+        if self.bounds is not None:
+            low = np.minimum(low, self.bounds[:2])
+            high = np.maximum(high, self.bounds[2:])
+        self.bounds = (float(low[0]), float(low[1]), float(high[0]), float(high[1]))
+
+    def _grow(self, needed):
+        capacity = len(self.points)
+        while capacity < needed:
+            capacity *= 2
+        self.points = np.resize(self.points, (capacity, 2))
+        self._pixels = np.resize(self._pixels, (capacity, 2))
+
+    def _decimate(self):
+        kept = self.points[:self.count:2].copy()
+        self.count = len(kept)
+        self.points[:self.count] = kept
+        self.stride *= 2
+        self._projected = 0
+        self._simplified = None
+
+    def project(self, zoom, origin):
+        view = (zoom, origin)
+        if view != self._view:
+            self._view = view
+            self._projected = 0
+            self._simplified = None
+        if self._projected < self.count:
+            self._pixels[self._projected:self.count] = project(self.points[self._projected:self.count], zoom, origin)
+            self._projected = self.count
+        return self._pixels[:self.count]
+
+    def visible(self, zoom, origin, rect):
+        # Cheap cull: does the projected bounding box touch rect at all?
+        if self.bounds is None:
+            return False
+        corners = project(np.array([self.bounds[:2], self.bounds[2:]]), zoom, origin)
+        return (corners[1, 0] >= rect.left and corners[0, 0] < rect.right and
+                corners[1, 1] < rect.bottom and corners[0, 1] >= rect.top)
+
+    def simplified(self, zoom, origin):
+        # A growing trail re-simplifies only every TRAIL_RAW_TAIL points and
+        # appends the newer points unsimplified in between.
+        pixels = self.project(zoom, origin)
+        if self._simplified is None or self.count - self._simplified_count > TRAIL_RAW_TAIL:
+            self._simplified = simplify(pixels)
+            self._simplified_count = self.count
+        if self._simplified_count == self.count:
+            return self._simplified
+        return np.vstack((self._simplified, pixels[self._simplified_count:]))
+
+    def runs(self, zoom, origin, rect):
+        # Simplified, clipped polylines ready for pygame.draw.lines, cached
+        # until the trail grows or the view changes.
+        key = (zoom, origin, tuple(rect), self.version)
+        if key != self._runs_key:
+            self._runs_key = key
+            if self.visible(zoom, origin, rect):
+                self._runs = clip_polyline(self.simplified(zoom, origin), rect)
+            else:
+                self._runs = []
+        return self._runs
+
+
+class TrailHistory:
+    # The trails of the most recent launches, oldest dropped past max_trails.
+    def __init__(self, max_trails=TRAIL_HISTORY):
+        self.max_trails = max_trails
+        self.trails = []
+
+    def __len__(self):
+        return len(self.trails)
+
+    def __iter__(self):
+        return iter(self.trails)
+
+    def __getitem__(self, index):
+        return self.trails[index]
+
+    def start(self):
+        self.trails.append(Trail())
+        del self.trails[:-self.max_trails]
+        return self.trails[-1]
+
+    def clear(self):
+        self.trails = []